@@ -0,0 +1,137 @@
+"""
+vRealize Automation 8.x Deployment Beacon for Salt
+==================================================
+
+Fires events when vRA deployments are created, finish, fail or get close to lease expiry.
+Uses the vra execution module (vra_module.py) for authentication and paging, so both need to be synced.
+
+Each poll only reads the deployments changed since the previous poll, the first poll reads every deployment once
+(max_pages does not apply to it) to learn their state and leases without firing events.
+
+Events are tagged salt/beacon/<minion id>/vra_deployments/<created / finished / failed / lease_expiring>
+
+Example configuration:
+
+beacons:
+  vra_deployments:
+    - url: vra.corp.local
+    - username: admin
+    - password: VMware1!
+    - interval: 30
+    - lease_warning: 86400
+
+"""
+
+
+#Import python libs
+import logging
+import re
+import time
+import calendar
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+__virtualname__ = 'vra_deployments'
+
+#Most deployments whose status and lease are remembered between polls
+MAX_TRACKED = 20000
+
+def __virtual__():
+    '''
+    Only load the beacon when the vra execution module is available
+    '''
+    if 'vra.get_deployment_changes' in __salt__:
+        return __virtualname__
+    else:
+        return False, 'The vra_deployments beacon cannot be loaded: vra execution module unavailable.'
+
+def _config_dict(config):
+    if isinstance(config, dict):
+        return config
+    _config = {}
+    for item in config:
+        _config.update(item)
+    return _config
+
+def validate(config):
+    """
+    Validate the beacon configuration
+    """
+    _config = _config_dict(config)
+    for key in ('url', 'username', 'password'):
+        if key not in _config:
+            return False, 'Configuration for vra_deployments beacon must contain ' + key
+    return True, 'Valid beacon configuration'
+
+def _event(name,deployment):
+    return {
+             "tag": name,
+             "id": deployment['id'],
+             "name": deployment.get('name'),
+             "status": deployment.get('status'),
+             "projectId": deployment.get('projectId'),
+             "ownedBy": deployment.get('ownedBy'),
+             "lastUpdatedAt": deployment.get('lastUpdatedAt'),
+             "leaseExpireAt": deployment.get('leaseExpireAt')
+           }
+
+def _epoch(timestamp):
+    """
+    Seconds since the epoch of a vRA ISO-8601 UTC timestamp (i.e. 2020-06-15T10:20:30.123Z)
+    """
+    seconds = calendar.timegm(time.strptime(timestamp[:19], '%Y-%m-%dT%H:%M:%S'))
+    fraction = re.match(r'\.\d+', timestamp[19:])
+    if fraction:
+        seconds = seconds + float(fraction.group(0))
+    return seconds
+
+def _remember(tracked,deployment_id,value):
+    tracked.pop(deployment_id, None)
+    tracked[deployment_id] = value
+    while len(tracked) > MAX_TRACKED:
+        tracked.popitem(last=False)
+
+def beacon(config):
+    """
+    Poll vRA for deployments changed since the last poll and return one event per lifecycle change
+    """
+    _config = _config_dict(config)
+    url = _config['url']
+    lease_warning = _config.get('lease_warning', 86400)
+    state = __context__.setdefault('vra_deployments.' + url, {"cursor": None, "status": OrderedDict(), "leases": OrderedDict()})
+    try:
+        changes = __salt__['vra.get_deployment_changes'](url,_config['username'],_config['password'],state["cursor"],
+                                                         _config.get('page_size', 100),_config.get('max_pages', 50))
+    except Exception as exc:
+        log.error('vra_deployments beacon could not poll %s: %s', url, exc)
+        return []
+    first_poll = state["cursor"] == None
+    since = _epoch(state["cursor"]["since"]) if state["cursor"] and state["cursor"]["since"] else None
+    state["cursor"] = changes["cursor"]
+    ret = []
+    for deployment in reversed(changes["deployments"]):
+        status = deployment.get('status') or ''
+        previous = state["status"].get(deployment['id'])
+        _remember(state["status"], deployment['id'], status)
+        lease = state["leases"].get(deployment['id'])
+        if deployment.get('leaseExpireAt'):
+            warned = lease != None and lease[0].get('leaseExpireAt') == deployment['leaseExpireAt'] and lease[1]
+            _remember(state["leases"], deployment['id'], [deployment, warned])
+        else:
+            state["leases"].pop(deployment['id'], None)
+        if first_poll or status == previous:
+            continue
+        if previous == None and since != None and deployment.get('createdAt') and _epoch(deployment['createdAt']) >= since:
+            ret.append(_event("created", deployment))
+        if status.endswith('SUCCESSFUL'):
+            ret.append(_event("finished", deployment))
+        elif status.endswith('FAILED'):
+            ret.append(_event("failed", deployment))
+    now = time.time()
+    for lease in state["leases"].values():
+        deployment, warned = lease
+        if not warned and _epoch(deployment['leaseExpireAt']) - now <= lease_warning:
+            lease[1] = True
+            ret.append(_event("lease_expiring", deployment))
+    return ret
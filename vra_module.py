@@ -13,6 +13,15 @@ vRealize Automation 8.x
 
 #Import python libs
 import logging
+import time
+import calendar
+import re
+import fnmatch
+import ipaddress
+import threading
+import hashlib
+import queue
+from concurrent.futures import ThreadPoolExecutor
 try:
     import json
     import requests
@@ -23,6 +32,17 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
+#Seconds a lookup index stays cached before it is rebuilt from vRA
+CACHE_TTL = 300
+_index_cache = {}
+_index_locks = {}
+_index_cache_lock = threading.Lock()
+
+#Deployment request states after which vRA no longer changes the request
+REQUEST_DONE_STATES = ("SUCCESSFUL", "FAILED", "ABORTED")
+#Content source sync states that mean the import is still running
+SYNC_RUNNING_STATES = ("PENDING", "QUEUED", "STARTED", "RUNNING", "INPROGRESS", "IN_PROGRESS")
+
 __virtual_name__ = 'vra'
 
 def __virtual__():
@@ -87,9 +107,362 @@ def get_token(url,username,password):
     else:
         return response.status_code
 
+def _iaas_get_all(api_url,headers,params=None,page_size=200):
+    """
+    Page through an iaas/api collection using $top / $skip and return every element
+    """
+    query = dict(params or {})
+    items = []
+    while True:
+        query['$top'] = page_size
+        query['$skip'] = len(items)
+        response = requests.get(api_url, headers=headers, params=query, verify=False)
+        response.raise_for_status()
+        json_data = json.loads(response.content.decode('utf-8'))
+        content = json_data.get('content', [])
+        items.extend(content)
+        if not content or len(items) >= json_data.get('totalElements', len(items)):
+            return items
+
+def _paged_iter(api_url,headers,params=None,page_size=100):
+    """
+    Page through a catalog / deployment / blueprint collection using page / size and yield every element,
+    the next page is only requested once the caller has consumed the current one
+    """
+    query = dict(params or {})
+    page = 0
+    while True:
+        query['page'] = page
+        query['size'] = page_size
+        response = requests.get(api_url, headers=headers, params=query, verify=False)
+        response.raise_for_status()
+        json_data = json.loads(response.content.decode('utf-8'))
+        content = json_data.get('content', [])
+        for item in content:
+            yield item
+        page = page + 1
+        if 'last' in json_data:
+            done = json_data['last']
+        elif 'totalPages' in json_data:
+            done = page >= json_data['totalPages']
+        else:
+            done = len(content) < page_size
+        if not content or done:
+            return
+
+def _paged_get_all(api_url,headers,params=None,page_size=100):
+    """
+    Page through a catalog / deployment / blueprint collection using page / size and return every element
+    """
+    return list(_paged_iter(api_url,headers,params,page_size))
+
+def _epoch(timestamp):
+    """
+    Seconds since the epoch of a vRA ISO-8601 UTC timestamp (i.e. 2020-06-15T10:20:30.123Z), None when not set
+    """
+    if not timestamp:
+        return None
+    match = re.match(r'(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(\.\d+)?', timestamp)
+    seconds = calendar.timegm(time.strptime(match.group(1), '%Y-%m-%dT%H:%M:%S'))
+    if match.group(2):
+        seconds = seconds + float(match.group(2))
+    return seconds
+
+def _link_ids(doc,rel):
+    """
+    Return the ids at the end of the href / hrefs of a _links relation (i.e. _links['fabric-networks'])
+    """
+    link = doc.get('_links', {}).get(rel, {})
+    hrefs = link.get('hrefs', [])
+    if 'href' in link:
+        hrefs = [link['href']]
+    return [x.rstrip('/').rsplit('/', 1)[-1] for x in hrefs]
+
+def _region_id_of(doc):
+    if doc.get('regionId') != None:
+        return doc['regionId']
+    region_ids = _link_ids(doc,'region')
+    if region_ids:
+        return region_ids[0]
+    return None
+
+def _matches(desired,current):
+    """
+    True when current already satisfies desired. Dicts only need the desired keys (an empty dict needs an empty one),
+    lists need the same elements in any order and scalars are compared loosely ("true" matches True)
+    """
+    if isinstance(desired, dict):
+        if not isinstance(current, dict):
+            return False
+        if not desired:
+            return not current
+        return all(k in current and _matches(v, current[k]) for k, v in desired.items())
+    if isinstance(desired, list):
+        if not isinstance(current, list) or len(desired) != len(current):
+            return False
+        remaining = list(current)
+        for item in desired:
+            for n, candidate in enumerate(remaining):
+                if _matches(item, candidate):
+                    del remaining[n]
+                    break
+            else:
+                return False
+        return True
+    if desired == None or current == None:
+        return desired == current
+    return desired == current or str(desired).lower() == str(current).lower()
+
+def _diff_fields(desired,current):
+    """
+    Return {field: {"old": ..., "new": ...}} for every desired field that current does not already satisfy
+    """
+    changes = {}
+    for field, value in desired.items():
+        if not _matches(value, current.get(field)):
+            changes[field] = {"old": current.get(field), "new": value}
+    return changes
+
+def _patch_if_changed(api_url,headers,desired,current,target,required=None):
+    """
+    PATCH only the fields of desired that differ from current, skipping the request when nothing differs.
+    Fields listed in required are sent with every PATCH.
+    """
+    changes = _diff_fields(desired,current)
+    if not changes:
+        print(target + ' is already up to date')
+        return {"result": "unchanged", "changes": {}}
+    data = dict((field, desired[field]) for field in changes)
+    for field in required or []:
+        data[field] = desired[field]
+    response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
+    json_data = json.loads(response.content.decode('utf-8'))
+    if response.status_code == 200:
+        print('Successfully Updated ' + target)
+        return {"result": "changed", "changes": changes, "response": json_data}
+    else:
+        print(response.status_code)
+        return json_data
+
+def _normalize_tags(tags):
+    """
+    Turn {"env": "prod"}, ["env:prod"], "env:prod,tier:web" or [{"key": "env", "value": "prod"}] into a list of key / value dicts
+    """
+    if isinstance(tags, dict):
+        return [{"key": k, "value": v} for k, v in tags.items()]
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    normalized = []
+    for tag in tags or []:
+        if isinstance(tag, dict):
+            normalized.append({"key": tag['key'], "value": tag.get('value', '')})
+        else:
+            key, sep, value = str(tag).partition(':')
+            normalized.append({"key": key, "value": value})
+    return normalized
+
+def _merge_tags(current,tags=None,remove=None):
+    """
+    Merge tags into the current tag list. A tag replaces any current tag with the same key, remove drops
+    every tag with a listed key ("env") or only the listed pair ("env:prod")
+    """
+    new_tags = _normalize_tags(tags)
+    new_keys = set(x['key'] for x in new_tags)
+    drop_keys = set()
+    drop_pairs = []
+    if isinstance(remove, str):
+        remove = remove.split(',')
+    for tag in remove or []:
+        if isinstance(tag, dict) or ':' in str(tag):
+            drop_pairs.extend(_normalize_tags([tag]))
+        else:
+            drop_keys.add(tag)
+    merged = []
+    for tag in current or []:
+        if tag['key'] in new_keys or tag['key'] in drop_keys or tag in drop_pairs:
+            continue
+        merged.append(tag)
+    return merged + new_tags
+
+def _run_concurrently(func,items,max_workers=8):
+    """
+    Run func over items with at most max_workers threads, results are returned in input order
+    """
+    items = list(items)
+    if not items:
+        return []
+    workers = max(1, min(int(max_workers), len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, items))
+
+def _cached_index(url,username,kind,build,refresh=False):
+    """
+    Return the cached index for url / username / kind, calling build() when it is missing, expired or refresh is set
+    """
+    key = (url, username, kind)
+    with _index_cache_lock:
+        lock = _index_locks.setdefault(key, threading.RLock())
+    with lock:
+        entry = _index_cache.get(key)
+        if refresh or entry is None or time.time() - entry[0] > CACHE_TTL:
+            entry = (time.time(), build())
+            _index_cache[key] = entry
+        return entry[1]
+
+def _invalidate_index(url,username,kind):
+    with _index_cache_lock:
+        _index_cache.pop((url, username, kind), None)
+
+def clear_cache(url=None):
+    """
+    Clear the cached lookup indexes so the next lookup reads vRA again
+
+    Arguments:
+
+    url = vRA FQDN to clear (if not set every cached index is cleared)
+    """
+    with _index_cache_lock:
+        for key in list(_index_cache):
+            if url == None or key[0] == url:
+                del _index_cache[key]
+    return 'Cleared cached indexes'
+
 ##########Cloud Assembly Configuration Functions##########
 
+######Tag Search######
+_TAGGED_RESOURCES = {
+    "zone": "iaas/api/zones",
+    "network": "iaas/api/fabric-networks",
+    "storage_profile": "iaas/api/storage-profiles",
+    "cloud_account": "iaas/api/cloud-accounts"
+}
+
+def _tag_index(url,username,password,resource_type,headers,refresh=False):
+    """
+    Inverted index of one resource type: {"resources": {id: resource}, "tags": {"key:value" / "key": set(ids)}}
+    """
+    def build():
+        api_url = '{0}{1}'.format(set_bas_url(url),_TAGGED_RESOURCES[resource_type])
+        index = {"resources": {}, "tags": {}}
+        for item in _iaas_get_all(api_url, headers):
+            tags = item.get('tags', [])
+            index["resources"][item['id']] = {"type": resource_type, "id": item['id'], "name": item.get('name'), "tags": tags}
+            for tag in tags:
+                index["tags"].setdefault(tag['key'] + ':' + tag.get('value', ''), set()).add(item['id'])
+                index["tags"].setdefault(tag['key'], set()).add(item['id'])
+        return index
+    return _cached_index(url,username,'tags:' + resource_type,build,refresh)
+
+def find_by_tags(url,username,password,query,resource_types=None,refresh=False):
+    """
+    Find Cloud Zones, fabric networks, Storage Profiles and Cloud Accounts carrying every tag in the query.
+    Each resource type is indexed once and re-read only when its index expires or refresh asks for it.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA admin user
+
+    password = vRA Admin password
+
+    query = Tags that must all be present, a bare key matches any value (i.e. "env:prod AND region:us-west-1" or ["env:prod","tier"])
+
+    resource_types = Resource types to search (zone / network / storage_profile / cloud_account, default is all)
+
+    refresh = Re-read every searched type (True) or only the listed types (i.e. ["network"]) before searching
+    """
+    if isinstance(query, str):
+        terms = [x.strip() for x in re.split(r'\s+AND\s+', query.strip(), flags=re.IGNORECASE) if x.strip()]
+    else:
+        terms = list(query)
+    if resource_types == None:
+        resource_types = sorted(_TAGGED_RESOURCES)
+    elif isinstance(resource_types, str):
+        resource_types = resource_types.split(',')
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    def search(resource_type):
+        type_refresh = refresh == True or (isinstance(refresh, (list, tuple)) and resource_type in refresh)
+        index = _tag_index(url,username,password,resource_type,headers,type_refresh)
+        matched = None
+        for term in terms:
+            ids = index["tags"].get(term, set())
+            matched = set(ids) if matched == None else matched & ids
+            if not matched:
+                return []
+        return [index["resources"][x] for x in matched or []]
+    found = []
+    for resources in _run_concurrently(search, resource_types, len(resource_types)):
+        found.extend(resources)
+    return sorted(found, key=lambda x: (x['type'], str(x['name'])))
+
 ######Cloud Account and Cloud Zones######
+def _aws_ca_data(aws_key_id,aws_access_key,name,region_name,create_zone="false"):
+    region_array = region_name.split(',')
+    data =  {
+                "description": "AWS Cloud Account",
+                "accessKeyId": aws_key_id,
+                "secretAccessKey": aws_access_key,
+                "cloudAccountProperties": {
+
+                },
+                "regionIds": region_array,
+                "createDefaultZones" : create_zone,
+                "name": name
+            }
+    return data
+
+def _azure_ca_data(sub_id,ten_id,app_id,app_key,name,region_name,create_zone="false"):
+    region_array = region_name.split(',')
+    data =  {
+              "name": name,
+              "description": "Azure Cloud Account",
+              "subscriptionId": sub_id,
+              "tenantId": ten_id,
+              "clientApplicationId": app_id,
+              "clientApplicationSecretKey": app_key,
+              "regionIds": region_array,
+              "createDefaultZones": create_zone
+            }
+    return data
+
+def _vsphere_ca_data(vc_hostname,vc_username,vc_password,name,region_name,create_zone="false"):
+    region_array = region_name.split(',')
+    data = {
+              "name": name,
+              "hostName": vc_hostname,
+              "acceptSelfSignedCertificate": "true",
+              "dcid": "onprem",
+              "username": vc_username,
+              "password": vc_password,
+              "regionIds": region_array,
+              "createDefaultZones": create_zone
+            }
+    return data
+
+def _nsxt_ca_data(nsx_hostname,nsx_username,nsx_password,name,ca_id):
+    data = {
+              "hostName": nsx_hostname,
+              "acceptSelfSignedCertificate": "true",
+              "password": nsx_password,
+              "dcid": "onprem",
+              "associatedCloudAccountIds": [ca_id],
+              "managerMode": "true",
+              "name": name,
+              "description": "NSX-T Cloud Account",
+              "username": nsx_username
+            }
+    return data
+
+def _invalidate_cloud_accounts(url,username):
+    """
+    Drop the indexes a new Cloud Account makes stale (its name, tags and the regions it brings)
+    """
+    _invalidate_index(url,username,'cloud-accounts')
+    _invalidate_index(url,username,'regions')
+    _invalidate_index(url,username,'tags:cloud_account')
+
 def create_aws_ca(url,username,password,aws_key_id,aws_access_key,name,region_name,create_zone="false"):
     """
     Setup and configure AWS Cloud Accounts
@@ -117,21 +490,11 @@ def create_aws_ca(url,username,password,aws_key_id,aws_access_key,name,region_na
     access_key = get_token(url,username, password)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/cloud-accounts-aws'.format(api_url_base)
-    region_array = region_name.split(',')
-    data =  {
-                "description": "AWS Cloud Account",
-                "accessKeyId": aws_key_id,
-                "secretAccessKey": aws_access_key,
-                "cloudAccountProperties": {
-
-                },
-                "regionIds": region_array,
-                "createDefaultZones" : create_zone,
-                "name": name
-            }
+    data = _aws_ca_data(aws_key_id,aws_access_key,name,region_name,create_zone)
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
     if response.status_code == 201:
         print('Successfully Created AWS Cloud Account')
+        _invalidate_cloud_accounts(url,username)
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
     else:
@@ -167,20 +530,11 @@ def create_azure_ca(url,username,password,sub_id,ten_id,app_id,app_key,name,regi
     access_key = get_token(url,username, password)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/cloud-accounts-azure'.format(api_url_base)
-    region_array = region_name.split(',')
-    data =  {
-              "name": name,
-              "description": "Azure Cloud Account",
-              "subscriptionId": sub_id,
-              "tenantId": ten_id,
-              "clientApplicationId": app_id,
-              "clientApplicationSecretKey": app_key,
-              "regionIds": region_array,
-              "createDefaultZones": create_zone
-            }
+    data = _azure_ca_data(sub_id,ten_id,app_id,app_key,name,region_name,create_zone)
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
     if response.status_code == 201:
         print('Successfully Created Azure Cloud Account')
+        _invalidate_cloud_accounts(url,username)
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
     else:
@@ -216,20 +570,11 @@ def create_vsphere_ca(url,username,password,vc_hostname,vc_username,vc_password,
     access_key = get_token(url,username, password)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/cloud-accounts-vsphere'.format(api_url_base)
-    region_array = region_name.split(',')
-    data = {
-              "name": name,
-              "hostName": vc_hostname,
-              "acceptSelfSignedCertificate": "true",
-              "dcid": "onprem",
-              "username": vc_username,
-              "password": vc_password,
-              "regionIds": region_array,
-              "createDefaultZones": create_zone
-            }
+    data = _vsphere_ca_data(vc_hostname,vc_username,vc_password,name,region_name,create_zone)
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
     if response.status_code == 201:
         print('Successfully Created vCenter Cloud Account')
+        _invalidate_cloud_accounts(url,username)
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
     else:
@@ -279,7 +624,7 @@ def get_ca_by_name(url,username,password,caname):
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
 
-def create_nsxt_ca(url,username,password,nsx_hostname,nsx_username,nsx_password,name,ca_name):
+def create_nsxt_ca(url,username,password,nsx_hostname,nsx_username,nsx_password,name,ca_name,ca_id=None):
     """
     Create NSX Cloud Account
 
@@ -300,29 +645,21 @@ def create_nsxt_ca(url,username,password,nsx_hostname,nsx_username,nsx_password,
     name = Provide a name for the Cloud Account
 
     ca_name = Name of Cloud Account to associate with NSX Cloud Account
+
+    ca_id = Id of the Cloud Account to associate, skips the lookup of ca_name when already known
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
-    ca_json = get_ca_by_name(url,username,password,ca_name)
-    ca_id = ca_json['id']
-    ca_array = []
-    ca_array.append(ca_id)
+    if ca_id == None:
+        ca_json = get_ca_by_name(url,username,password,ca_name)
+        ca_id = ca_json['id']
     api_url = '{0}iaas/api/cloud-accounts-nsx-t'.format(api_url_base)
-    data = {
-              "hostName": nsx_hostname,
-              "acceptSelfSignedCertificate": "true",
-              "password": nsx_password,
-              "dcid": "onprem",
-              "associatedCloudAccountIds": ca_array,
-              "managerMode": "true",
-              "name": name,
-              "description": "NSX-T Cloud Account",
-              "username": nsx_username
-            }
+    data = _nsxt_ca_data(nsx_hostname,nsx_username,nsx_password,name,ca_id)
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
     if response.status_code == 201:
         print('Successfully Created NSX-T Cloud Account')
+        _invalidate_cloud_accounts(url,username)
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
     else:
@@ -330,6 +667,90 @@ def create_nsxt_ca(url,username,password,nsx_hostname,nsx_username,nsx_password,
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
 
+_CA_TYPES = {
+    "aws": ("iaas/api/cloud-accounts-aws", _aws_ca_data),
+    "azure": ("iaas/api/cloud-accounts-azure", _azure_ca_data),
+    "vsphere": ("iaas/api/cloud-accounts-vsphere", _vsphere_ca_data),
+    "nsxt": ("iaas/api/cloud-accounts-nsx-t", _nsxt_ca_data)
+}
+
+def _create_ca_from_spec(api_url_base,headers,spec,ca_ids):
+    start = time.time()
+    spec = dict(spec)
+    ca_type = str(spec.pop('type', '')).lower()
+    result = {"name": spec.get('name'), "type": ca_type}
+    try:
+        endpoint, build_data = _CA_TYPES[ca_type]
+        if ca_type == "nsxt":
+            ca_name = spec.pop('ca_name')
+            if ca_name not in ca_ids:
+                raise LookupError("Cloud Account " + ca_name + " not found or failed to create")
+            spec['ca_id'] = ca_ids[ca_name]
+        data = build_data(**spec)
+        api_url = '{0}{1}'.format(api_url_base,endpoint)
+        response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
+        json_data = json.loads(response.content.decode('utf-8'))
+        result['status_code'] = response.status_code
+        if response.status_code == 201:
+            result['status'] = "created"
+            result['id'] = json_data['id']
+        else:
+            result['status'] = "failed"
+            result['error'] = json_data
+    except Exception as exc:
+        result['status'] = "failed"
+        result['error'] = str(exc)
+    result['seconds'] = round(time.time() - start, 3)
+    return result
+
+def create_cloud_accounts(url,username,password,accounts,max_workers=8):
+    """
+    Create many AWS, Azure, vSphere and NSX-T Cloud Accounts concurrently.
+    NSX-T accounts are created after the account named in their ca_name when it is part of the same batch.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA admin user
+
+    password = vRA Admin password
+
+    accounts = List of account specs. Each spec has a type (aws / azure / vsphere / nsxt) and the arguments of the
+    matching create_*_ca function (i.e. [{"type": "aws", "name": "AWS-Cloud-Account", "aws_key_id": "...", "aws_access_key": "...", "region_name": "us-west-1"}])
+
+    max_workers = Maximum number of Cloud Accounts created at the same time (default is 8)
+    """
+    start = time.time()
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    batch_names = set(spec.get('name') for spec in accounts if str(spec.get('type', '')).lower() != "nsxt")
+    first_wave = []
+    second_wave = []
+    for n, spec in enumerate(accounts):
+        if str(spec.get('type', '')).lower() == "nsxt" and spec.get('ca_name') in batch_names:
+            second_wave.append((n, spec))
+        else:
+            first_wave.append((n, spec))
+    ca_ids = {}
+    if any(spec.get('ca_name') not in batch_names for n, spec in first_wave if str(spec.get('type', '')).lower() == "nsxt"):
+        api_url = '{0}iaas/api/cloud-accounts'.format(api_url_base)
+        for ca in _iaas_get_all(api_url, headers):
+            ca_ids[ca['name']] = ca['id']
+    results = [None] * len(accounts)
+    for wave in (first_wave, second_wave):
+        wave_results = _run_concurrently(lambda item: _create_ca_from_spec(api_url_base,headers,item[1],ca_ids), wave, max_workers)
+        for (n, spec), result in zip(wave, wave_results):
+            results[n] = result
+            if result['status'] == "created":
+                ca_ids[result['name']] = result['id']
+    created = len([x for x in results if x['status'] == "created"])
+    if created:
+        _invalidate_cloud_accounts(url,username)
+    print('Created ' + str(created) + ' of ' + str(len(results)) + ' Cloud Accounts')
+    return {"accounts": results, "seconds": round(time.time() - start, 3)}
+
 def get_czid_by_name(url,username,password,czname):
     """
     Retrieve Cloud Zone by Name for further configurations
@@ -388,40 +809,10 @@ def get_region_by_caname(url,username,password,region_name,caname):
 
     czaname = Cloud Account Name
     """
-    api_url_base = set_bas_url(url)
-    access_key = get_token(url,username, password)
-    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
-    api_url = '{0}iaas/api/regions'.format(api_url_base)
-    response = requests.get(api_url, headers=headers, verify=False)
-    ca_json = get_ca_by_name(url,username,password,caname)
-    ca_id = ca_json['id']
-    if response.status_code == 200:
-        json_data = json.loads(response.content.decode('utf-8'))
-        n = 0
-        end_n = json_data['totalElements']
-        end_n = end_n - 1
-        while True:
-            reg_name = json_data['content'][n]['name']
-            if reg_name == region_name:
-                print("Found Region: " + region_name)
-                caid = json_data['content'][n]['_links']['cloud-account']['href']
-                caid = caid[25:]
-                if caid == ca_id:
-                    reg_id = json_data['content'][n]['id']
-                    return reg_id
-                    break
-                elif n < end_n:
-                    n = n + 1
-            elif n < end_n:
-                n = n + 1
-            elif n >= end_n:
-                print("No Match Found For Region: " + region_name)
-                return "No Match Found For Region: " + region_name
-                break
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    region = get_region(url,username,password,region_name,caname)
+    if isinstance(region, dict):
+        return region['id']
+    return region
 
 def create_cloudzone(url,username,password,czname,region_name,caname,folder=None,ppolicy="DEFAULT"):
     """
@@ -447,7 +838,7 @@ def create_cloudzone(url,username,password,czname,region_name,caname,folder=None
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
-    reg_id = get_cloud_regionid_by_name(url,username,password,region_name)
+    reg_id = get_cloud_regionid_by_name(url,username,password,region_name,caname)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/zones'.format(api_url_base)
     if folder != None:
@@ -481,7 +872,7 @@ def create_cloudzone(url,username,password,czname,region_name,caname,folder=None
 
 def tag_cloudzone(url,username,password,czname,tag_key,tag_value):
     """
-    Tag Cloud Zone
+    Tag Cloud Zone, tags with other keys already on the zone are kept
 
     Arguments:
 
@@ -497,29 +888,102 @@ def tag_cloudzone(url,username,password,czname,tag_key,tag_value):
 
     tag_value = Value for the tag (i.e. tag_key:vsphere)
     """
+    return update_cloudzone_tags(url,username,password,czname,{tag_key: tag_value})
+
+def _update_zone_tags(api_url_base,headers,cz_json,tags,remove):
+    api_url = '{0}iaas/api/zones/{1}'.format(api_url_base,cz_json['id'])
+    data =  {
+              "name": cz_json['name'],
+              "tags": _merge_tags(cz_json.get('tags', []),tags,remove)
+            }
+    current = dict(cz_json, tags=cz_json.get('tags', []))
+    return _patch_if_changed(api_url,headers,data,current,'Cloud Zone Tags: ' + cz_json['name'],required=["name"])
+
+def update_cloudzone_tags(url,username,password,czname,tags=None,remove=None):
+    """
+    Add, replace or remove several tags on a Cloud Zone with one read and at most one update.
+    Tags not mentioned are kept.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA admin user
+
+    password = vRA Admin password
+
+    czname = Cloud Zone Name
+
+    tags = Tags to add, replacing any tag with the same key (i.e. {"env": "aws", "tier": "gold"} or 'env:aws,tier:gold')
+
+    remove = Tags to remove, by key or key:value (i.e. ["owner","env:test"] or 'owner,env:test')
+    """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
-    czid = get_czid_by_name(url,username,password,czname)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
-    api_url = '{0}iaas/api/zones/{1}'.format(api_url_base,czid)
-    data =  {
-              "name": czname,
-              "tags": [
-                {
-                  "key": tag_key,
-                  "value": tag_value
-                }
-              ]
-            }
-    response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 200:
-        print('Successfully Tagged Cloud Zone')
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
-    else:
+    api_url = '{0}iaas/api/zones'.format(api_url_base)
+    params = {"$filter": "name eq '{0}'".format(czname.replace("'", "''"))}
+    response = requests.get(api_url, headers=headers, params=params, verify=False)
+    if response.status_code != 200:
         print(response.status_code)
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
+    json_data = json.loads(response.content.decode('utf-8'))
+    for cz in json_data.get('content', []):
+        if cz['name'] == czname:
+            result = _update_zone_tags(api_url_base,headers,cz,tags,remove)
+            _invalidate_index(url,username,'tags:zone')
+            return result
+    print("No Match Found For Cloud Zone: " + czname)
+    return "No Match Found For Cloud Zone: " + czname
+
+def tag_cloudzones(url,username,password,cznames,tags=None,remove=None,max_workers=8):
+    """
+    Add, replace or remove several tags on many Cloud Zones. Zones are read with one listing and updated
+    concurrently, zones that already carry the tags are not updated.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA admin user
+
+    password = vRA Admin password
+
+    cznames = List of Cloud Zone names (i.e. ["AWS-Cloud-Account / us-west-1","Azure-Cloud-Account / eastus"] or a comma separated string)
+
+    tags = Tags to add, replacing any tag with the same key (i.e. {"env": "aws", "tier": "gold"} or 'env:aws,tier:gold')
+
+    remove = Tags to remove, by key or key:value (i.e. ["owner","env:test"] or 'owner,env:test')
+
+    max_workers = Maximum number of Cloud Zones updated at the same time (default is 8)
+    """
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    if isinstance(cznames, str):
+        cznames = cznames.split(',')
+    zones = {}
+    for cz in _iaas_get_all('{0}iaas/api/zones'.format(api_url_base), headers):
+        zones[cz['name']] = cz
+    results = {}
+    work = []
+    for czname in cznames:
+        if czname in zones:
+            work.append(zones[czname])
+        else:
+            print("No Match Found For Cloud Zone: " + czname)
+            results[czname] = "No Match Found For Cloud Zone: " + czname
+    def tag_zone(cz):
+        try:
+            return _update_zone_tags(api_url_base,headers,cz,tags,remove)
+        except Exception as exc:
+            return {"result": "failed", "changes": {}, "error": str(exc)}
+    zone_results = _run_concurrently(tag_zone, work, max_workers)
+    for cz, result in zip(work, zone_results):
+        results[cz['name']] = result
+    _invalidate_index(url,username,'tags:zone')
+    return results
 
 def delete_cloudzone(url,username,password,czname):
     """
@@ -676,35 +1140,16 @@ def add_member_to_project(url,username,password,projname,member_email):
     proj_json = get_proj_by_name(url,username,password,projname)
     proj_id = proj_json['id']
     proj_members = proj_json['members']
-    member_len = (len(proj_members))
     new_member = {"email": member_email,"type": "user"}
-    payload = []
-    if member_len == 0:
-        payload.append(new_member)
-    else:
-        n = 0
-        end = member_len - 1
-        while True:
-            if n <= end:
-                payload.append(proj_members[n])
-                n = n + 1
-            elif n > end:
-                break
+    payload = list(proj_members)
+    if not any(x.get('email') == member_email for x in payload):
         payload.append(new_member)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/projects/{1}'.format(api_url_base,proj_id)
     data =  {
               "members": payload
             }
-    response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 200:
-        print("Successfully added " + member_email + " to Project as member")
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    return _patch_if_changed(api_url,headers,data,proj_json,'Project Members: ' + projname)
 
 def add_admin_to_project(url,username,password,projname,admin_email):
     """
@@ -727,35 +1172,16 @@ def add_admin_to_project(url,username,password,projname,admin_email):
     proj_json = get_proj_by_name(url,username,password,projname)
     proj_id = proj_json['id']
     proj_admins = proj_json['administrators']
-    admin_len = (len(proj_admins))
     new_admin = {"email": admin_email,"type": "user"}
-    payload = []
-    if admin_len == 0:
-        payload.append(new_admin)
-    else:
-        n = 0
-        end = admin_len - 1
-        while True:
-            if n <= end:
-                payload.append(proj_admins[n])
-                n = n + 1
-            elif n > end:
-                break
+    payload = list(proj_admins)
+    if not any(x.get('email') == admin_email for x in payload):
         payload.append(new_admin)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/projects/{1}'.format(api_url_base,proj_id)
     data =  {
               "administrators": payload
             }
-    response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 200:
-        print("Successfully added " + admin_email + " to Project as admin")
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    return _patch_if_changed(api_url,headers,data,proj_json,'Project Administrators: ' + projname)
 
 def add_group_member_to_project(url,username,password,projname,group_email):
     """
@@ -778,35 +1204,16 @@ def add_group_member_to_project(url,username,password,projname,group_email):
     proj_json = get_proj_by_name(url,username,password,projname)
     proj_id = proj_json['id']
     proj_members = proj_json['members']
-    member_len = (len(proj_members))
     new_member = {"email": group_email,"type": "group"}
-    payload = []
-    if member_len == 0:
-        payload.append(new_member)
-    else:
-        n = 0
-        end = member_len - 1
-        while True:
-            if n <= end:
-                payload.append(proj_members[n])
-                n = n + 1
-            elif n > end:
-                break
+    payload = list(proj_members)
+    if not any(x.get('email') == group_email for x in payload):
         payload.append(new_member)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/projects/{1}'.format(api_url_base,proj_id)
     data =  {
               "members": payload
             }
-    response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 200:
-        print("Successfully added " + group_email + " to Project as member")
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    return _patch_if_changed(api_url,headers,data,proj_json,'Project Members: ' + projname)
 
 def add_group_admin_to_project(url,username,password,projname,group_email):
     """
@@ -825,42 +1232,21 @@ def add_group_admin_to_project(url,username,password,projname,group_email):
     group_email: Email of the group you want to add (i.e. - vRA-All-Services-admins@acme.local
 
     """
-
-
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username,password)
     proj_json = get_proj_by_name(url,username,password,projname)
     proj_id = proj_json['id']
     proj_admins = proj_json['administrators']
-    admin_len = (len(proj_admins))
     new_admin = {"email": group_email,"type": "group"}
-    payload = []
-    if admin_len == 0:
-        payload.append(new_admin)
-    else:
-        n = 0
-        end = admin_len - 1
-        while True:
-            if n <= end:
-                payload.append(proj_admins[n])
-                n = n + 1
-            elif n > end:
-                break
+    payload = list(proj_admins)
+    if not any(x.get('email') == group_email for x in payload):
         payload.append(new_admin)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/projects/{1}'.format(api_url_base,proj_id)
     data =  {
               "administrators": payload
             }
-    response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 200:
-        print("Successfully added " + group_email + " to Project as admin")
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    return _patch_if_changed(api_url,headers,data,proj_json,'Project Administrators: ' + projname)
 
 def add_cloudzone_to_project(url,username,password,projname,czname,priority=None,store_limit=None,cpu_limit=None,mem_limit=None,max_num=None):
     """
@@ -895,7 +1281,6 @@ def add_cloudzone_to_project(url,username,password,projname,czname,priority=None
     proj_json = get_proj_by_name(url,username,password,projname)
     proj_id = proj_json['id']
     proj_zones = proj_json['zones']
-    zone_len = (len(proj_zones))
     czid = get_czid_by_name(url,username,password,czname)
     if priority is None:
         priority = 0
@@ -908,34 +1293,15 @@ def add_cloudzone_to_project(url,username,password,projname,czname,priority=None
     if max_num is None:
         max_num = 0
     new_zone = {"storageLimitGB": store_limit,"cpuLimit": cpu_limit,"memoryLimitMB": mem_limit,"zoneId": czid,"maxNumberInstances": max_num,"priority": priority}
-    payload = []
-    if zone_len == 0:
-        payload.append(new_zone)
-    else:
-        n = 0
-        end = zone_len - 1
-        while True:
-            if n <= end:
-                payload.append(proj_zones[n])
-                n = n + 1
-            elif n > end:
-                break
-        payload.append(new_zone)
+    payload = [x for x in proj_zones if x.get('zoneId') != czid]
+    payload.append(new_zone)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/projects/{1}'.format(api_url_base,proj_id)
     data =  {
               "zoneAssignmentConfigurations": payload
             }
-    print(data)
-    response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 200:
-        print("Successfully added Cloud Zone " + czname + " to Project")
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    current = {"zoneAssignmentConfigurations": proj_zones}
+    return _patch_if_changed(api_url,headers,data,current,'Project Cloud Zones: ' + projname)
 
 def enable_tf_on_project(url,username,password,projname):
     """
@@ -957,20 +1323,18 @@ def enable_tf_on_project(url,username,password,projname):
     proj_id = proj_json['id']
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}project-service/api/projects/{1}'.format(api_url_base,proj_id)
+    response = requests.get(api_url, headers=headers, verify=False)
+    if response.status_code != 200:
+        print(response.status_code)
+        json_data = json.loads(response.content.decode('utf-8'))
+        return json_data
+    current = json.loads(response.content.decode('utf-8'))
     data =  {
               "properties": {
                  "__allowTerraformCloudzoneMapping": "true"
               }
             }
-    response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 200:
-        print("Successfully enabled Terraform Service on project: " + projname)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    return _patch_if_changed(api_url,headers,data,current,'Terraform Service on project: ' + projname)
 
 def disable_tf_on_project(url,username,password,projname):
     """
@@ -992,19 +1356,17 @@ def disable_tf_on_project(url,username,password,projname):
     proj_id = proj_json['id']
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}project-service/api/projects/{1}'.format(api_url_base,proj_id)
+    response = requests.get(api_url, headers=headers, verify=False)
+    if response.status_code != 200:
+        print(response.status_code)
+        json_data = json.loads(response.content.decode('utf-8'))
+        return json_data
+    current = json.loads(response.content.decode('utf-8'))
     data =  {
               "properties": {
               }
             }
-    response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 200:
-        print("Successfully disabled Terraform Service on project: " + projname)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    return _patch_if_changed(api_url,headers,data,current,'Terraform Service on project: ' + projname)
 
 def remove_all_cz_from_project(url,username,password,projname):
     """
@@ -1029,15 +1391,8 @@ def remove_all_cz_from_project(url,username,password,projname):
     data =  {
               "zoneAssignmentConfigurations": []
             }
-    response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 200:
-        print("Removed ALL Cloud Zones from project: " + projname)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    current = {"zoneAssignmentConfigurations": proj_json['zones']}
+    return _patch_if_changed(api_url,headers,data,current,'Project Cloud Zones: ' + projname)
 
 def delete_project(url,username,password,projname):
     """
@@ -1069,7 +1424,84 @@ def delete_project(url,username,password,projname):
         return json_data
 
 ######Flavor Mappings######
-def get_cloud_regionid_by_name(url,username,password,region_name):
+def _cloud_account_index(url,username,password,refresh=False):
+    """
+    Index of Cloud Account ids keyed by Cloud Account name
+    """
+    def build():
+        api_url_base = set_bas_url(url)
+        access_key = get_token(url,username, password)
+        headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+        index = {}
+        for ca in _iaas_get_all('{0}iaas/api/cloud-accounts'.format(api_url_base), headers):
+            index[ca['name']] = ca['id']
+        return index
+    return _cached_index(url,username,'cloud-accounts',build,refresh)
+
+def _region_index(url,username,password,refresh=False):
+    """
+    Index of every region keyed by (Cloud Account name or id, externalRegionId or name) and by region alone
+    """
+    def build():
+        api_url_base = set_bas_url(url)
+        access_key = get_token(url,username, password)
+        headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+        ca_names = dict((v, k) for k, v in _cloud_account_index(url,username,password,refresh).items())
+        index = {"by_account": {}, "by_region": {}}
+        for region in _iaas_get_all('{0}iaas/api/regions'.format(api_url_base), headers):
+            ca_id = region.get('cloudAccountId')
+            if ca_id == None:
+                ca_id = region['_links']['cloud-account']['href'].rsplit('/', 1)[-1]
+            region = dict(region, cloudAccountId=ca_id, cloudAccountName=ca_names.get(ca_id))
+            for region_key in set([region.get('externalRegionId'), region.get('name')]):
+                if region_key == None:
+                    continue
+                index["by_region"].setdefault(region_key, []).append(region)
+                index["by_account"][(ca_id, region_key)] = region
+                if region['cloudAccountName'] != None:
+                    index["by_account"][(region['cloudAccountName'], region_key)] = region
+        return index
+    return _cached_index(url,username,'regions',build,refresh)
+
+def get_region(url,username,password,region_name,caname=None,refresh=False):
+    """
+    Get a Region from the cached region index and return information via json
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA admin user
+
+    password = vRA Admin password
+
+    region_name = externalRegionId of the Region (e.g. - us-west-1, eastus, Datacenter:datacenter-2)
+
+    caname = Name or id of the Cloud Account owning the Region, required when several Cloud Accounts share a Region name
+
+    refresh = Rebuild the region index from vRA before the lookup (default is False)
+    """
+    for attempt in ((True,) if refresh else (False, True)):
+        index = _region_index(url,username,password,attempt)
+        if caname != None:
+            region = index["by_account"].get((caname, region_name))
+            if region != None:
+                return region
+            continue
+        regions = index["by_region"].get(region_name, [])
+        if len(regions) == 1:
+            return regions[0]
+        elif len(regions) > 1:
+            ca_list = ", ".join(sorted(str(x['cloudAccountName'] or x['cloudAccountId']) for x in regions))
+            print("Region " + region_name + " is shared by Cloud Accounts " + ca_list + ", provide caname")
+            return "Region " + region_name + " is shared by Cloud Accounts " + ca_list + ", provide caname"
+    if caname != None:
+        print("No Match Found For Region: " + region_name + " in Cloud Account: " + caname)
+        return "No Match Found For Region: " + region_name + " in Cloud Account: " + caname
+    print("No Match Found For Region: " + region_name)
+    return "No Match Found For Region: " + region_name
+
+def get_cloud_regionid_by_name(url,username,password,region_name,caname=None):
     """
     Get Cloud Region Id for Further Configurations
 
@@ -1083,36 +1515,15 @@ def get_cloud_regionid_by_name(url,username,password,region_name):
 
     region_name = Provide a name of Region to search for
 
+    caname = Name of the Cloud Account owning the Region (only needed when several Cloud Accounts share the Region)
     """
-    api_url_base = set_bas_url(url)
-    access_key = get_token(url,username, password)
-    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
-    api_url = '{0}iaas/api/regions'.format(api_url_base,region_name)
-    response = requests.get(api_url, headers=headers, verify=False)
-    if response.status_code == 200:
-        json_data = json.loads(response.content.decode('utf-8'))
-        n = 0
-        end_n = json_data['totalElements']
-        end_n = end_n - 1
-        while True:
-            reg_name = json_data['content'][n]['externalRegionId']
-            if reg_name == region_name:
-                print("Found Cloud Zone: " + region_name)
-                reg_id = json_data['content'][n]['id']
-                return reg_id
-                break
-            elif n < end_n:
-                n = n + 1
-            elif n >= end_n:
-                print("No Match Found For Cloud Zone: " + region_name)
-                return "No Match Found For Cloud Zone: " + region_name
-                break
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    region = get_region(url,username,password,region_name,caname)
+    if isinstance(region, dict):
+        print("Found Region: " + region_name)
+        return region['id']
+    return region
 
-def create_cloud_flavor(url,username,password,flavor_name,mapping_name,cloud_instance_name,region_name):
+def create_cloud_flavor(url,username,password,flavor_name,mapping_name,cloud_instance_name,region_name,caname=None):
     """
     Create Cloud Flavor
     Abstracts cloud images and assigns a size value to them (e.g. - small, medium, large)
@@ -1133,10 +1544,11 @@ def create_cloud_flavor(url,username,password,flavor_name,mapping_name,cloud_ins
 
     region_name = Cloud Region (e.g. - Azure: eastus)
 
+    caname = Name of the Cloud Account owning the region (only needed when several Cloud Accounts share the region)
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username,password)
-    reg_id = get_cloud_regionid_by_name(url,username,password,region_name)
+    reg_id = get_cloud_regionid_by_name(url,username,password,region_name,caname)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/flavor-profiles'.format(api_url_base)
     data =  {
@@ -1222,27 +1634,15 @@ def update_cloud_flavor(url,username,password,flavor_name,mapping_name,cloud_ins
     flav_json = get_flavor_by_name(url,username,password,flavor_name)
     flav_id = flav_json['id']
     current_flavors = flav_json['flavorMappings']['mapping']
-    a = json.dumps(current_flavors)
-    a = a[1:-1]
-    new_flavor =  {mapping_name:{"name": cloud_instance_name}}
-    b = json.dumps(new_flavor)
-    b = b[1:-1]
-    combined = a + "," + b
+    combined = dict(current_flavors)
+    combined[mapping_name] = {"name": cloud_instance_name}
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/flavor-profiles/{1}'.format(api_url_base,flav_id)
-    payload = "{" + '"' + "flavorMapping" + '"' + ":" " {"+ combined + "}}"
-    data = json.loads(payload)
-    response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 200:
-        print('Successfully Updated Cloud Flavor')
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    data = {"flavorMapping": combined}
+    current = {"flavorMapping": current_flavors}
+    return _patch_if_changed(api_url,headers,data,current,'Cloud Flavor: ' + flavor_name)
 
-def create_vsphere_flavor(url,username,password,flavor_name,mapping_name,cpu_count,mem_count,region_name):
+def create_vsphere_flavor(url,username,password,flavor_name,mapping_name,cpu_count,mem_count,region_name,caname=None):
     """
     Create vSphere Flavor
     vSphere Flavor is a size of an image, t-shirt sizing"
@@ -1264,10 +1664,12 @@ def create_vsphere_flavor(url,username,password,flavor_name,mapping_name,cpu_cou
     mem_count = amount of memory assigned using this flavor in GB (i.e. 4)
 
     region_name = The datacenter id for the Cloud Account (i.e. Datacenter:datacenter-2)
+
+    caname = Name of the Cloud Account owning the region (only needed when several Cloud Accounts share the region)
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username,password)
-    reg_id = get_cloud_regionid_by_name(url,username,password,region_name)
+    reg_id = get_cloud_regionid_by_name(url,username,password,region_name,caname)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/flavor-profiles'.format(api_url_base)
     data =  {
@@ -1315,25 +1717,85 @@ def update_vsphere_flavor(url,username,password,flavor_name,mapping_name,cpu_cou
     flav_json = get_flavor_by_name(url,username,password,flavor_name)
     flav_id = flav_json['id']
     current_flavors = flav_json['flavorMappings']['mapping']
-    a = json.dumps(current_flavors)
-    a = a[1:-1]
-    new_flavor = {mapping_name:{"cpuCount": cpu_count,"memoryInMB": mem_count}}
-    b = json.dumps(new_flavor)
-    b = b[1:-1]
-    combined = a + "," + b
+    combined = dict(current_flavors)
+    combined[mapping_name] = {"cpuCount": cpu_count,"memoryInMB": mem_count}
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/flavor-profiles/{1}'.format(api_url_base,flav_id)
-    payload = "{" + '"' + "flavorMapping" + '"' + ":" " {"+ combined + "}}"
-    data = json.loads(payload)
-    response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 200:
-        print('Successfully Updated vSphere Flavor')
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
-    else:
+    data = {"flavorMapping": combined}
+    current = {"flavorMapping": current_flavors}
+    return _patch_if_changed(api_url,headers,data,current,'vSphere Flavor: ' + flavor_name)
+
+def apply_flavor_mappings(url,username,password,flavor_name,region_name,mappings,caname=None):
+    """
+    Create or update every mapping of a Flavor Profile in a single request.
+    Mappings that already match are left alone and no request is sent when nothing changed.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA admin user
+
+    password = vRA Admin password
+
+    flavor_name = Name of the Flavor Mapping (i.e. aws)
+
+    region_name = Cloud Region of the Flavor Profile (e.g. - us-west-1, eastus, Datacenter:datacenter-2)
+
+    mappings = Dict of mapping name to instance type, or to cpuCount / memoryInMB for vSphere
+    (i.e. {"small": "t2.small", "medium": "t2.medium"} or {"small": {"cpuCount": 1, "memoryInMB": 1024}})
+
+    caname = Name of the Cloud Account owning the region (only needed when several Cloud Accounts share the region)
+    """
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username,password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    region = get_region(url,username,password,region_name,caname)
+    if not isinstance(region, dict):
+        return {"result": "failed", "changes": {}, "error": region}
+    reg_id = region['id']
+    desired = {}
+    for mapping_name, value in mappings.items():
+        if isinstance(value, dict):
+            desired[mapping_name] = dict(value)
+        else:
+            desired[mapping_name] = {"name": value}
+    api_url = '{0}iaas/api/flavor-profiles'.format(api_url_base)
+    profile = None
+    for flav in _iaas_get_all(api_url, headers):
+        if flav['name'] == flavor_name and _region_id_of(flav) in (reg_id, None):
+            profile = flav
+            break
+    if profile == None:
+        data = {"name": flavor_name,"flavorMapping": desired,"regionId": reg_id}
+        response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
+        json_data = json.loads(response.content.decode('utf-8'))
+        if response.status_code == 201:
+            print('Successfully Created Cloud Flavor: ' + flavor_name)
+            changes = dict((mapping_name, {"old": None, "new": spec}) for mapping_name, spec in desired.items())
+            return {"result": "changed", "changes": changes, "response": json_data}
         print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
         return json_data
+    current = profile.get('flavorMappings', {}).get('mapping', {})
+    changes = {}
+    for mapping_name, spec in desired.items():
+        if not _matches(spec, current.get(mapping_name)):
+            changes[mapping_name] = {"old": current.get(mapping_name), "new": spec}
+    if not changes:
+        print('Flavor Mapping ' + flavor_name + ' is already up to date')
+        return {"result": "unchanged", "changes": {}}
+    combined = dict(current)
+    for mapping_name in changes:
+        combined[mapping_name] = desired[mapping_name]
+    api_url = '{0}iaas/api/flavor-profiles/{1}'.format(api_url_base,profile['id'])
+    data = {"flavorMapping": combined}
+    response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
+    json_data = json.loads(response.content.decode('utf-8'))
+    if response.status_code == 200:
+        print('Successfully Updated Cloud Flavor: ' + flavor_name)
+        return {"result": "changed", "changes": changes, "response": json_data}
+    print(response.status_code)
+    return json_data
 
 def delete_flavor_mapping(url,username,password,flavor_name):
     """
@@ -1365,7 +1827,7 @@ def delete_flavor_mapping(url,username,password,flavor_name):
         return json_data
 
 ######Image Mappings######
-def create_image_mapping(url,username,password,profile_name,image_name,image_id,region_name):
+def create_image_mapping(url,username,password,profile_name,image_name,image_id,region_name,caname=None):
     """
     Create Image Mapping.
     An image mapping ties a cloud image (AWS = AMI, vSphere = Template) to a Cloud Zone Region
@@ -1385,10 +1847,12 @@ def create_image_mapping(url,username,password,profile_name,image_name,image_id,
     image_id = name of the image instance (i.e. ami-03659409b9c7d0c5f or vsphere-ubuntu-template)
 
     region_name = The datacenter id for the Cloud Account (i.e. Datacenter:datacenter-2 or eastus or us-west-1)
+
+    caname = Name of the Cloud Account owning the region (only needed when several Cloud Accounts share the region)
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username,password)
-    reg_id = get_cloud_regionid_by_name(url,username,password,region_name)
+    reg_id = get_cloud_regionid_by_name(url,username,password,region_name,caname)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/image-profiles'.format(api_url_base)
     data =  {
@@ -1444,8 +1908,8 @@ def get_image_profile_by_name(url,username,password,profile_name):
             elif n < end_n:
                 n = n + 1
             elif n >= end_n:
-                print("No Match Found For Flavor Mapping: " + flavor_name)
-                return "No Match Found For Flavor Mapping: " + flavor_name
+                print("No Match Found For Image Mapping: " + profile_name)
+                return "No Match Found For Image Mapping: " + profile_name
                 break
     else:
         print(response.status_code)
@@ -1475,25 +1939,126 @@ def update_image_mapping(url,username,password,profile_name,image_name,image_id)
     img_json = get_image_profile_by_name(url,username,password,profile_name)
     img_id = img_json['id']
     current_image = img_json['imageMappings']['mapping']
-    a = json.dumps(current_image)
-    a = a[1:-1]
-    new_image = {image_name: {"name": image_id}}
-    b = json.dumps(new_image)
-    b = b[1:-1]
-    combined = a + "," + b
+    combined = dict(current_image)
+    existing = current_image.get(image_name, {})
+    if image_id not in (existing.get('name'), existing.get('externalId')):
+        combined[image_name] = {"name": image_id}
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/image-profiles/{1}'.format(api_url_base,img_id)
-    payload = "{" + '"' + "imageMapping" + '"' + ":" " {"+ combined + "}}"
-    data = json.loads(payload)
+    data = {"imageMapping": combined}
+    current = {"imageMapping": current_image}
+    return _patch_if_changed(api_url,headers,data,current,'Image Mapping: ' + profile_name)
+
+def _fabric_image_index(url,username,password,refresh=False):
+    """
+    Index of fabric image ids keyed by (externalRegionId, image name or externalId)
+    """
+    def build():
+        api_url_base = set_bas_url(url)
+        access_key = get_token(url,username, password)
+        headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+        index = {}
+        for image in _iaas_get_all('{0}iaas/api/fabric-images'.format(api_url_base), headers):
+            for image_key in (image.get('name'), image.get('externalId')):
+                if image_key != None:
+                    index.setdefault((image.get('externalRegionId'), image_key), image['id'])
+        return index
+    return _cached_index(url,username,'fabric-images',build,refresh)
+
+def _apply_region_image_mappings(api_url_base,headers,profile_name,region,images,profiles,fabric_index):
+    region_name = region['externalRegionId']
+    desired = {}
+    for image_name, image_id in images.items():
+        fabric_id = fabric_index.get((region_name, image_id))
+        if fabric_id != None:
+            desired[image_name] = {"id": fabric_id}
+        else:
+            desired[image_name] = {"name": image_id}
+    profile = None
+    for img in profiles:
+        if img['name'] == profile_name and _region_id_of(img) in (region['id'], None):
+            profile = img
+            break
+    if profile == None:
+        api_url = '{0}iaas/api/image-profiles'.format(api_url_base)
+        data =  {
+                  "name" : profile_name,
+                  "description": "Image Profile for " + profile_name,
+                  "imageMapping" : desired,
+                  "regionId": region['id']
+                }
+        response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
+        if response.status_code == 201:
+            print("Successfully Created Image Mapping: " + profile_name + " in " + region_name)
+            changes = dict((image_name, {"old": None, "new": spec}) for image_name, spec in desired.items())
+            return {"result": "changed", "changes": changes}
+        print(response.status_code)
+        return {"result": "failed", "changes": {}, "error": json.loads(response.content.decode('utf-8'))}
+    current = profile.get('imageMappings', {}).get('mapping', {})
+    changes = {}
+    for image_name, spec in desired.items():
+        existing = current.get(image_name, {})
+        if "id" in spec:
+            matches = existing.get('id') == spec['id']
+        else:
+            matches = spec['name'] in (existing.get('name'), existing.get('externalId'))
+        if not matches:
+            changes[image_name] = {"old": current.get(image_name), "new": spec}
+    if not changes:
+        return {"result": "unchanged", "changes": {}}
+    combined = dict(current)
+    for image_name in changes:
+        combined[image_name] = desired[image_name]
+    api_url = '{0}iaas/api/image-profiles/{1}'.format(api_url_base,profile['id'])
+    data = {"imageMapping": combined}
     response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
     if response.status_code == 200:
-        print('Successfully Updated Image Mapping: ' + profile_name)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+        print('Successfully Updated Image Mapping: ' + profile_name + " in " + region_name)
+        return {"result": "changed", "changes": changes}
+    print(response.status_code)
+    return {"result": "failed", "changes": {}, "error": json.loads(response.content.decode('utf-8'))}
+
+def apply_image_mappings(url,username,password,profile_name,mappings,caname=None,max_workers=8):
+    """
+    Create or update many Image Mappings of an Image Profile across regions.
+    Each region's profile is written at most once and left alone when every mapping already matches.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA admin user
+
+    password = vRA Admin password
+
+    profile_name = The name of the image profile (i.e.vsphere-images)
+
+    mappings = Dict of region name to a dict of image name to image id
+    (i.e. {"us-west-1": {"Ubuntu": "ami-03659409b9c7d0c5f"}, "Datacenter:datacenter-2": {"Ubuntu": "vsphere-ubuntu-template"}})
+
+    caname = Name of the Cloud Account owning the regions (only needed when several Cloud Accounts share a region)
+
+    max_workers = Maximum number of regions written at the same time (default is 8)
+    """
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username,password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    profiles = _iaas_get_all('{0}iaas/api/image-profiles'.format(api_url_base), headers)
+    fabric_index = _fabric_image_index(url,username,password)
+    results = {}
+    work = []
+    for region_name, images in mappings.items():
+        region = get_region(url,username,password,region_name,caname)
+        if isinstance(region, dict):
+            work.append((region_name, region, images))
+        else:
+            results[region_name] = {"result": "failed", "changes": {}, "error": region}
+    def apply_region(item):
+        region_name, region, images = item
+        return region_name, _apply_region_image_mappings(api_url_base,headers,profile_name,region,images,profiles,fabric_index)
+    for region_name, result in _run_concurrently(apply_region, work, max_workers):
+        results[region_name] = result
+    return results
 
 def delete_image_mapping(url,username,password,profile_name):
     """
@@ -1525,7 +2090,7 @@ def delete_image_mapping(url,username,password,profile_name):
         return json_data
 
 ######Network Profiles######
-def create_network_profile(url,username,password,region_name,net_profile_name):
+def create_network_profile(url,username,password,region_name,net_profile_name,caname=None):
     """
     Create Network Profile.
 
@@ -1540,10 +2105,12 @@ def create_network_profile(url,username,password,region_name,net_profile_name):
     net_profile_name = The name of the network profile (i.e.vsphere-networks)
 
     region_name = The datacenter id for the Cloud Account (i.e. Datacenter:datacenter-2 or eastus or us-west-1)
+
+    caname = Name of the Cloud Account owning the region (only needed when several Cloud Accounts share the region)
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
-    reg_id = get_cloud_regionid_by_name(url,username,password,region_name)
+    reg_id = get_cloud_regionid_by_name(url,username,password,region_name,caname)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/network-profiles'.format(api_url_base)
     data = {
@@ -1665,36 +2232,99 @@ def add_network_to_profile(url,username,password,region_name,net_profile_name,fa
 
     fabric_net_name = The name of the network that was discovered by vRA discover service (i.e.web-network)
     """
+    return add_networks_to_profile(url,username,password,net_profile_name,names=[fabric_net_name],region_name=region_name)
+
+def _network_selected(net,names,name_pattern,cidr):
+    if net['name'] in names:
+        return True
+    if name_pattern == None and cidr == None:
+        return False
+    if name_pattern != None and not fnmatch.fnmatchcase(net['name'], name_pattern):
+        return False
+    if cidr != None:
+        try:
+            if not ipaddress.ip_network(net.get('cidr'), strict=False).subnet_of(cidr):
+                return False
+        except (TypeError, ValueError):
+            return False
+    return True
+
+def add_networks_to_profile(url,username,password,net_profile_name,names=None,name_pattern=None,cidr=None,region_name=None):
+    """
+    Adds many discovered networks to an existing Network Profile with a single update
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA admin user
+
+    password = vRA Admin password
+
+    net_profile_name = The name of the network profile (i.e.vsphere-networks)
+
+    names = List of network names discovered by vRA (i.e. ['web-network','app-network'] or 'web-network,app-network')
+
+    name_pattern = Add every network whose name matches this pattern (i.e. 'VLAN-1*')
+
+    cidr = Add every network inside this CIDR (i.e. 10.10.0.0/16), combined with name_pattern when both are set
+
+    region_name = Region of the Network Profile (i.e. Datacenter:datacenter-2 or eastus or us-west-1), networks are
+    always limited to the region and Cloud Account of the profile
+    """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
-    reg_id = get_cloud_regionid_by_name(url,username,password,region_name)
-    prof_json = get_netprofile_by_name(url,username,password,net_profile_name)
-    fab_net_json = get_fabric_network_by_name(url,username,password,fabric_net_name)
-    fab_net_id = fab_net_json['id']
-    fab_id = []
-    fab_id.append(fab_net_id)
-    try:
-        current_assigned_networks = prof_json['_links']['fabric-networks']['hrefs']
-        for net in current_assigned_networks:
-            net = net[26:]
-            fab_id.append(net)
-    except:
-        print("Currently no networks assigned")
-    prof_id = prof_json['id']
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
-    api_url = '{0}iaas/api/network-profiles/{1}'.format(api_url_base,prof_id)
+    prof_json = None
+    for prof in _iaas_get_all('{0}iaas/api/network-profiles'.format(api_url_base), headers):
+        if prof['name'] == net_profile_name:
+            prof_json = prof
+            break
+    if prof_json == None:
+        print("No Match Found For Network Profile: " + net_profile_name)
+        return "No Match Found For Network Profile: " + net_profile_name
+    prof_region = prof_json.get('externalRegionId')
+    prof_ca = prof_json.get('cloudAccountId')
+    if prof_region == None or prof_ca == None:
+        api_url = '{0}iaas/api/regions/{1}'.format(api_url_base,_region_id_of(prof_json))
+        response = requests.get(api_url, headers=headers, verify=False)
+        if response.status_code != 200:
+            print(response.status_code)
+            json_data = json.loads(response.content.decode('utf-8'))
+            return json_data
+        region = json.loads(response.content.decode('utf-8'))
+        prof_region = region.get('externalRegionId')
+        prof_ca = region.get('cloudAccountId') or _link_ids(region,'cloud-account')[0]
+    if region_name != None and region_name != prof_region:
+        print("Network Profile " + net_profile_name + " is in region " + str(prof_region) + " not " + region_name)
+        return "Network Profile " + net_profile_name + " is in region " + str(prof_region) + " not " + region_name
+    if isinstance(names, str):
+        names = names.split(',')
+    names = set(names or [])
+    if cidr != None:
+        cidr = ipaddress.ip_network(cidr, strict=False)
+    selected = {}
+    rejected = set()
+    for net in _iaas_get_all('{0}iaas/api/fabric-networks'.format(api_url_base), headers):
+        if not _network_selected(net,names,name_pattern,cidr):
+            continue
+        if net.get('externalRegionId') != prof_region or prof_ca not in net.get('cloudAccountIds', [prof_ca]):
+            rejected.add(net['name'])
+            continue
+        selected[net['id']] = net['name']
+    current_ids = _link_ids(prof_json,'fabric-networks')
+    fab_id = current_ids + [x for x in selected if x not in current_ids]
+    api_url = '{0}iaas/api/network-profiles/{1}'.format(api_url_base,prof_json['id'])
     data = {
               "fabricNetworkIds": fab_id
             }
-    response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 200:
-        json_data = json.loads(response.content.decode('utf-8'))
-        print('Successfully Added Network to Network Profile: ' + net_profile_name)
-        return json_data
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    current = {"fabricNetworkIds": current_ids}
+    result = _patch_if_changed(api_url,headers,data,current,'Network Profile: ' + net_profile_name)
+    if 'result' in result:
+        result['added'] = sorted(selected[x] for x in selected if x not in current_ids)
+        result['missing'] = sorted(names - set(selected.values()) - rejected)
+        result['rejected'] = sorted(rejected - set(selected.values()))
+    return result
 
 def get_cloud_acct_type(url,username,password,caid):
     """
@@ -1794,19 +2424,14 @@ def add_nsxt_network_to_profile(url,username,password,region_name,net_profile_na
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
-    reg_id = get_cloud_regionid_by_name(url,username,password,region_name)
     prof_json = get_netprofile_by_name(url,username,password,net_profile_name)
     fab_net_json = get_nsxt_fabric_network_by_name(url,username,password,fabric_net_name)
     fab_net_id = fab_net_json['id']
     fab_id = []
     fab_id.append(fab_net_id)
-    try:
-        current_assigned_networks = prof_json['_links']['fabric-networks']['hrefs']
-        for net in current_assigned_networks:
-            net = net[26:]
+    for net in _link_ids(prof_json,'fabric-networks'):
+        if net != fab_net_id:
             fab_id.append(net)
-    except:
-        print("Currently no networks assigned")
     prof_id = prof_json['id']
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/network-profiles/{1}'.format(api_url_base,prof_id)
@@ -1845,30 +2470,103 @@ def tag_fabric_network(url,username,password,fabric_net_name,tag_key,tag_value):
     access_key = get_token(url,username, password)
     fab_net_json = get_fabric_network_by_name(url,username,password,fabric_net_name)
     fab_net_id = fab_net_json['id']
-    try:
-        current_tags = fab_net_json['tags']
-        new_tag = {"key": tag_key,"value": tag_value}
-        current_tags.append(new_tag)
-        tags = current_tags
-    except:
-        print("Currently no tags assigned")
-        tags = []
-        new_tag = {"key": tag_key,"value": tag_value}
+    current_tags = fab_net_json.get('tags', [])
+    new_tag = {"key": tag_key,"value": tag_value}
+    tags = list(current_tags)
+    if new_tag not in tags:
         tags.append(new_tag)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/fabric-networks/{1}'.format(api_url_base,fab_net_id)
     data = {
               "tags": tags
             }
-    response = requests.patch(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 200:
-        json_data = json.loads(response.content.decode('utf-8'))
-        print('Successfully Tagged Fabric Network: ' + fabric_net_name)
-        return json_data
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    current = {"tags": current_tags}
+    result = _patch_if_changed(api_url,headers,data,current,'Fabric Network Tags: ' + fabric_net_name)
+    if result.get('result') == "changed":
+        _invalidate_index(url,username,'tags:network')
+    return result
+
+def tag_fabric_networks(url,username,password,tags,name_pattern=None,name_regex=None,region_name=None,caname=None,cidr=None,max_workers=8):
+    """
+    Tags every discovered network matching a selector. Networks are read with one listing and only
+    the networks missing one of the tags are updated, with at most max_workers updates at a time.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA admin user
+
+    password = vRA Admin password
+
+    tags = Tags to add (i.e. {"env": "prod", "tier": "web"} or ["env:prod","tier:web"] or 'env:prod,tier:web')
+
+    name_pattern = Only networks whose name matches this pattern (i.e. 'VLAN-1*')
+
+    name_regex = Only networks whose name matches this regular expression (i.e. '^web-.*-prod$')
+
+    region_name = Only networks in this region (i.e. Datacenter:datacenter-2 or eastus or us-west-1)
+
+    caname = Only networks discovered by this Cloud Account
+
+    cidr = Only networks inside this CIDR (i.e. 10.10.0.0/16)
+
+    max_workers = Maximum number of networks updated at the same time (default is 8)
+
+    At least one of name_pattern, name_regex, region_name, caname or cidr is required.
+    """
+    if name_pattern == None and name_regex == None and region_name == None and caname == None and cidr == None:
+        print('Provide at least one selector for the networks to tag')
+        return 'Provide at least one selector for the networks to tag'
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    new_tags = _normalize_tags(tags)
+    if name_regex != None:
+        name_regex = re.compile(name_regex)
+    if cidr != None:
+        cidr = ipaddress.ip_network(cidr, strict=False)
+    ca_id = None
+    if caname != None:
+        ca_id = _cloud_account_index(url,username,password).get(caname)
+        if ca_id == None:
+            print("No Match Found For Cloud Account: " + caname)
+            return "No Match Found For Cloud Account: " + caname
+    work = []
+    unchanged = 0
+    for net in _iaas_get_all('{0}iaas/api/fabric-networks'.format(api_url_base), headers):
+        if region_name != None and net.get('externalRegionId') != region_name:
+            continue
+        if ca_id != None and ca_id not in net.get('cloudAccountIds', []):
+            continue
+        if name_regex != None and not name_regex.search(net['name']):
+            continue
+        if (name_pattern != None or cidr != None) and not _network_selected(net,set(),name_pattern,cidr):
+            continue
+        current_tags = net.get('tags', [])
+        missing = [x for x in new_tags if x not in current_tags]
+        if missing:
+            work.append((net, current_tags, current_tags + missing))
+        else:
+            unchanged = unchanged + 1
+    def tag_network(item):
+        net, current_tags, merged = item
+        api_url = '{0}iaas/api/fabric-networks/{1}'.format(api_url_base,net['id'])
+        try:
+            result = _patch_if_changed(api_url,headers,{"tags": merged},{"tags": current_tags},'Fabric Network Tags: ' + net['name'])
+        except Exception as exc:
+            return {"name": net['name'], "id": net['id'], "status": "failed", "error": str(exc)}
+        if 'result' not in result:
+            return {"name": net['name'], "id": net['id'], "status": "failed", "error": result}
+        return {"name": net['name'], "id": net['id'], "status": result['result']}
+    results = _run_concurrently(tag_network, work, max_workers)
+    _invalidate_index(url,username,'tags:network')
+    return {
+             "changed": len([x for x in results if x['status'] == "changed"]),
+             "unchanged": unchanged + len([x for x in results if x['status'] == "unchanged"]),
+             "failed": len([x for x in results if x['status'] == "failed"]),
+             "networks": results
+           }
 
 def config_ondemand_sec_groups_vsphere_network_profile(url,username,password,net_profile_name,edge_router_name,t0_router_name):
     """
@@ -1978,18 +2676,9 @@ def add_sec_group_vsphere_net_profile(url,username,password,net_profile_name,sec
     net_prof_id = net_prof_json['id']
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/network-profiles/{1}'.format(api_url_base,net_prof_id)
-    try:
-        current_secgroups = net_prof_json['_links']['security-groups']['hrefs']
-        sec_groups = []
-        for x in current_secgroups:
-            x = x[26:]
-            sec_groups.append(x)
-        new_sec_group = get_sec_group_by_name(url,username,password,secgroup_name)
-        sec_groups.append(new_sec_group)
-    except:
-        print("Currently no Security Groups assigned")
-        sec_groups = []
-        new_sec_group = get_sec_group_by_name(url,username,password,secgroup_name)
+    sec_groups = _link_ids(net_prof_json,'security-groups')
+    new_sec_group = get_sec_group_by_name(url,username,password,secgroup_name)
+    if new_sec_group not in sec_groups:
         sec_groups.append(new_sec_group)
     data = {
               "securityGroupIds": sec_groups
@@ -2034,9 +2723,55 @@ def delete_netprofile(url,username,password,net_profile_name):
         return json_data
 
 ######Storage Profiles######
-def get_vsphere_datastore_by_name(url,username,password,datastore_name):
+_VSPHERE_FABRIC = {
+    "datastore": ("vsphere-datastores", "iaas/api/fabric-vsphere-datastores", "vSphere Datastore"),
+    "policy": ("vsphere-storage-policies", "iaas/api/fabric-vsphere-storage-policies", "vSphere Storage Policy")
+}
+
+def _vsphere_fabric_index(url,username,password,fabric_type,refresh=False):
+    """
+    Indexes of a fabric vSphere collection by id, name, (region, name) and (Cloud Account id, region, name)
+    """
+    kind, path, label = _VSPHERE_FABRIC[fabric_type]
+    def build():
+        api_url_base = set_bas_url(url)
+        access_key = get_token(url,username, password)
+        headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+        index = {"by_id": {}, "by_name": {}, "by_region": {}, "by_account": {}}
+        for item in _iaas_get_all('{0}{1}'.format(api_url_base,path), headers):
+            region_name = item.get('externalRegionId')
+            index["by_id"][item['id']] = item
+            index["by_name"].setdefault(item['name'], []).append(item)
+            index["by_region"].setdefault((region_name, item['name']), []).append(item)
+            for ca_id in item.get('cloudAccountIds', []):
+                index["by_account"].setdefault((ca_id, region_name, item['name']), []).append(item)
+        return index
+    return _cached_index(url,username,kind,build,refresh)
+
+def _get_vsphere_fabric(url,username,password,fabric_type,name,region_name=None,caname=None,refresh=False):
+    label = _VSPHERE_FABRIC[fabric_type][2]
+    index = _vsphere_fabric_index(url,username,password,fabric_type,refresh)
+    if name in index["by_id"]:
+        return index["by_id"][name]
+    if caname != None:
+        ca_id = _cloud_account_index(url,username,password).get(caname, caname)
+        docs = index["by_account"].get((ca_id, region_name, name), [])
+    elif region_name != None:
+        docs = index["by_region"].get((region_name, name), [])
+    else:
+        docs = index["by_name"].get(name, [])
+    if len(docs) == 1:
+        print("Found " + label + ": " + name)
+        return docs[0]
+    elif len(docs) > 1:
+        print(label + " " + name + " exists in several regions, provide region_name")
+        return label + " " + name + " exists in several regions, provide region_name"
+    print("No Match Found For " + label + ": " + name)
+    return "No Match Found For " + label + ": " + name
+
+def get_vsphere_datastore(url,username,password,datastore,region_name=None,caname=None,refresh=False):
     """
-    Get vsphere datastore by name and return information via json.
+    Get vsphere datastore by name or id from the cached datastore index and return information via json.
 
     Arguments:
 
@@ -2046,36 +2781,59 @@ def get_vsphere_datastore_by_name(url,username,password,datastore_name):
 
     password = vRA Admin password
 
-    datastore_name = The name of the datastore (i.e.sc2c01vsan01)
+    datastore = The name or id of the datastore (i.e.sc2c01vsan01)
+
+    region_name = Region of the datastore, needed when the name exists in several regions (i.e. Datacenter:datacenter-2)
+
+    caname = Name of the vSphere Cloud Account of the datastore (requires region_name)
+
+    refresh = Rebuild the datastore index from vRA before the lookup (default is False)
     """
-    api_url_base = set_bas_url(url)
-    access_key = get_token(url,username, password)
-    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
-    api_url = '{0}iaas/api/fabric-vsphere-datastores'.format(api_url_base,datastore_name)
-    response = requests.get(api_url, headers=headers, verify=False)
-    if response.status_code == 200:
-        json_data = json.loads(response.content.decode('utf-8'))
-        n = 0
-        end_n = json_data['totalElements']
-        end_n = end_n - 1
-        while True:
-            ds_name = json_data['content'][n]['name']
-            if ds_name == datastore_name:
-                print("Found vSphere Datastore: " + datastore_name)
-                ds_id = json_data['content'][n]
-                return ds_id
-                break
-            elif n < end_n:
-                n = n + 1
-            elif n >= end_n:
-                print("No Match Found For vSphere Datastore: " + datastore_name)
-                break
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    return _get_vsphere_fabric(url,username,password,"datastore",datastore,region_name,caname,refresh)
+
+def get_vsphere_storage_policy(url,username,password,policy,region_name=None,caname=None,refresh=False):
+    """
+    Get vSphere storage policy by name or id from the cached storage policy index and return information via json.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA admin user
+
+    password = vRA Admin password
+
+    policy = The name or id of the storage policy (i.e. "vSAN Default Storage Policy")
+
+    region_name = Region of the storage policy, needed when the name exists in several regions (i.e. Datacenter:datacenter-2)
+
+    caname = Name of the vSphere Cloud Account of the storage policy (requires region_name)
+
+    refresh = Rebuild the storage policy index from vRA before the lookup (default is False)
+    """
+    return _get_vsphere_fabric(url,username,password,"policy",policy,region_name,caname,refresh)
+
+def get_vsphere_datastore_by_name(url,username,password,datastore_name,region_name=None,caname=None):
+    """
+    Get vsphere datastore by name and return information via json.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA admin user
+
+    password = vRA Admin password
+
+    datastore_name = The name of the datastore (i.e.sc2c01vsan01)
+
+    region_name = Region of the datastore, needed when the name exists in several regions (i.e. Datacenter:datacenter-2)
+
+    caname = Name of the vSphere Cloud Account of the datastore (requires region_name)
+    """
+    return get_vsphere_datastore(url,username,password,datastore_name,region_name,caname)
 
-def get_storage_policy_id_by_name(url,username,password,policy_name):
+def get_storage_policy_id_by_name(url,username,password,policy_name,region_name=None,caname=None):
     """
     Get storage policy id by name and return information via json.
 
@@ -2089,33 +2847,15 @@ def get_storage_policy_id_by_name(url,username,password,policy_name):
     password = vRA Admin password
 
     policy_name = The name of the storage policy (i.e. "vSAN Default Storage Policy")
+
+    region_name = Region of the storage policy, needed when the name exists in several regions (i.e. Datacenter:datacenter-2)
+
+    caname = Name of the vSphere Cloud Account of the storage policy (requires region_name)
     """
-    api_url_base = set_bas_url(url)
-    access_key = get_token(url,username, password)
-    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
-    api_url = '{0}iaas/api/fabric-vsphere-storage-policies'.format(api_url_base,policy_name)
-    response = requests.get(api_url, headers=headers, verify=False)
-    if response.status_code == 200:
-        json_data = json.loads(response.content.decode('utf-8'))
-        n = 0
-        end_n = json_data['totalElements']
-        end_n = end_n - 1
-        while True:
-            sp_name = json_data['content'][n]['name']
-            if sp_name == policy_name:
-                print("Found vSphere Storage Polcy: " + policy_name)
-                sp_id = json_data['content'][n]['id']
-                return sp_id
-                break
-            elif n < end_n:
-                n = n + 1
-            elif n >= end_n:
-                print("No Match Found For vSphere Storage Policy: " + policy_name)
-                break
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    policy_json = get_vsphere_storage_policy(url,username,password,policy_name,region_name,caname)
+    if isinstance(policy_json, dict):
+        return policy_json['id']
+    return policy_json
 
 def get_storage_profile_by_name(url,username,password,storage_profile_name):
     """
@@ -2134,31 +2874,126 @@ def get_storage_profile_by_name(url,username,password,storage_profile_name):
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
-    api_url = '{0}iaas/api/storage-profiles'.format(api_url_base,policy_name)
-    response = requests.get(api_url, headers=headers, verify=False)
-    if response.status_code == 200:
+    api_url = '{0}iaas/api/storage-profiles'.format(api_url_base)
+    for sp in _iaas_get_all(api_url, headers):
+        if sp['name'] == storage_profile_name:
+            print("Found Storage Profile: " + storage_profile_name)
+            return sp
+    print("No Match Found For Storage Profile: " + storage_profile_name)
+    return "No Match Found For Storage Profile: " + storage_profile_name
+
+def _storage_tags(tag_key,tag_value):
+    if tag_key != None and tag_value != None:
+        return [{"key": tag_key,"value": tag_value}]
+    return []
+
+def _vsphere_storage_data(name,reg_id,ds_id,encrypted="false",sharelevel="normal",diskmode="independent-persistent",tag_key=None,iops_limit=None,tag_value=None,shares="1000",provision_type="thin",default="false",disktype="standard",policy_id=None):
+    data = {
+              "supportsEncryption": encrypted,
+              "sharesLevel": sharelevel,
+              "description": "vSphere Storage",
+              "diskMode": diskmode,
+              "tags": _storage_tags(tag_key,tag_value),
+              "shares": shares,
+              "provisioningType": provision_type,
+              "regionId": reg_id,
+              "name": name,
+              "defaultItem": default,
+              "diskType": disktype,
+              "datastoreId": ds_id
+            }
+    if policy_id != None:
+        data["storagePolicyId"] = policy_id
+    if iops_limit != None:
+        data["limitIops"] = iops_limit
+    return data
+
+def _create_vsphere_storage_from_spec(url,username,password,api_url_base,headers,spec):
+    spec = dict(spec)
+    name = spec.pop('name')
+    region_name = spec.pop('region_name')
+    datastore_name = spec.pop('datastore_name')
+    policy_name = spec.pop('policy_name', None)
+    caname = spec.pop('caname', None)
+    result = {"name": name, "region_name": region_name, "datastore_name": datastore_name}
+    region = get_region(url,username,password,region_name,caname)
+    if not isinstance(region, dict):
+        result.update(status="failed", error=region)
+        return result
+    datastore = get_vsphere_datastore(url,username,password,datastore_name,region['externalRegionId'],caname)
+    if not isinstance(datastore, dict):
+        result.update(status="failed", error=datastore)
+        return result
+    policy_id = None
+    if policy_name != None:
+        policy = get_vsphere_storage_policy(url,username,password,policy_name,region['externalRegionId'],caname)
+        if not isinstance(policy, dict):
+            result.update(status="failed", error=policy)
+            return result
+        policy_id = policy['id']
+    try:
+        data = _vsphere_storage_data(name,region['id'],datastore['id'],policy_id=policy_id,**spec)
+        api_url = '{0}iaas/api/storage-profiles-vsphere'.format(api_url_base)
+        response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
         json_data = json.loads(response.content.decode('utf-8'))
-        n = 0
-        end_n = json_data['totalElements']
-        end_n = end_n - 1
-        while True:
-            sp_name = json_data['content'][n]['name']
-            if sp_name == storage_profile_name:
-                print("Found Storage Profile: " + storage_profile_name)
-                sp_id = json_data['content'][n]
-                return sp_id
-                break
-            elif n < end_n:
-                n = n + 1
-            elif n >= end_n:
-                print("No Match Found For Storage Profile: " + storage_profile_name)
-                break
+    except Exception as exc:
+        result.update(status="failed", error=str(exc))
+        return result
+    if response.status_code == 201:
+        result.update(status="created", id=json_data['id'])
     else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+        result.update(status="failed", error=json_data)
+    return result
+
+def create_vsphere_storage_profiles(url,username,password,profiles,defaults=None,max_workers=8):
+    """
+    Creates many vSphere Storage Profiles, i.e. one per datastore or region, in one pass.
+    Datastores and storage policies are resolved from one cached listing each.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin user
+
+    password = vRA Admin password
+
+    profiles = List of profiles with name, region_name, datastore_name and any option of create_vsphere_storage_profile
+    (i.e. [{"name": "vsan-gold", "region_name": "Datacenter:datacenter-2", "datastore_name": "sc2c01vsan01", "policy_name": "vSAN Default Storage Policy"}])
 
-def create_vsphere_storage_profile(url,username,password,name,region_name,datastore_name,encrypted="false",sharelevel="normal",diskmode="independent-persistent",tag_key=None,iops_limit=None,tag_value=None,shares="1000",provision_type="thin",default="false",disktype="standard",policy_name=None):
+    defaults = Options applied to every profile unless the profile sets them (i.e. {"provision_type": "thin", "tag_key": "tier", "tag_value": "gold"})
+
+    max_workers = Maximum number of Storage Profiles created at the same time (default is 8)
+    """
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    results = [None] * len(profiles)
+    specs = []
+    for n, profile in enumerate(profiles):
+        spec = dict(defaults or {})
+        spec.update(profile if isinstance(profile, dict) else {})
+        missing = [x for x in ("name", "region_name", "datastore_name") if spec.get(x) == None]
+        if missing:
+            results[n] = {"name": spec.get('name'), "region_name": spec.get('region_name'), "datastore_name": spec.get('datastore_name'),
+                          "status": "failed", "error": "Storage Profile is missing " + ", ".join(missing)}
+        else:
+            specs.append((n, spec))
+    def create(item):
+        n, spec = item
+        try:
+            return _create_vsphere_storage_from_spec(url,username,password,api_url_base,headers,spec)
+        except Exception as exc:
+            return {"name": spec['name'], "region_name": spec['region_name'], "datastore_name": spec['datastore_name'], "status": "failed", "error": str(exc)}
+    for (n, spec), result in zip(specs, _run_concurrently(create, specs, max_workers)):
+        results[n] = result
+    created = len([x for x in results if x['status'] == "created"])
+    if created:
+        _invalidate_index(url,username,'tags:storage_profile')
+    print('Created ' + str(created) + ' of ' + str(len(results)) + ' vSphere Storage Profiles')
+    return results
+
+def create_vsphere_storage_profile(url,username,password,name,region_name,datastore_name,encrypted="false",sharelevel="normal",diskmode="independent-persistent",tag_key=None,iops_limit=None,tag_value=None,shares="1000",provision_type="thin",default="false",disktype="standard",policy_name=None,caname=None):
     """
     Creates a vSphere Storage Profile
 
@@ -2197,58 +3032,24 @@ def create_vsphere_storage_profile(url,username,password,name,region_name,datast
     disk_type = Type of disk for this profile (standard (default) / fcd)
 
     policy_name = The name of the storage policy from vCenter to use for this profile (if argument not added then datastore default policy is applied)
+
+    caname = Name of the Cloud Account owning the region (only needed when several Cloud Accounts share the region)
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
-    reg_id = get_cloud_regionid_by_name(url,username,password,region_name)
-    if tag_key != None:
-        if tag_value != None:
-            tag_prep = {"key": tag_key,"value": tag_value}
-            tag = []
-            tag.append(tag_prep)
-    else:
-        tag = []
-    ds_json = get_vsphere_datastore_by_name(url,username,password,datastore_name)
+    reg_id = get_cloud_regionid_by_name(url,username,password,region_name,caname)
+    ds_json = get_vsphere_datastore_by_name(url,username,password,datastore_name,region_name,caname)
     ds_id = ds_json['id']
+    policy_id = None
+    if policy_name != None:
+        policy_id = get_storage_policy_id_by_name(url,username,password,policy_name,region_name,caname)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/storage-profiles-vsphere'.format(api_url_base)
-    payload = {
-              "supportsEncryption": encrypted,
-              "sharesLevel": sharelevel,
-              "description": "vSphere Storage",
-              "diskMode": diskmode,
-              "tags": tag,
-              "shares": shares,
-              "provisioningType": provision_type,
-              "regionId": reg_id,
-              "name": name,
-              "defaultItem": default,
-              "diskType": disktype,
-              "datastoreId": ds_id
-            }
-    if policy_name != None:
-        policy_id = get_storage_policy_id_by_name(url,username,password,policy_name)
-        a = json.dumps(payload)
-        a = a[1:-1]
-        policy = {"storagePolicyId": policy_id}
-        b = json.dumps(policy)
-        b = b[1:-1]
-        combined = a + "," + b
-        payload = "{" + combined + "}"
-        payload = json.loads(payload)
-    if iops_limit != None:
-        c = json.dumps(payload)
-        c = c[1:-1]
-        iops = {"limitIops": iops_limit}
-        d = json.dumps(iops)
-        d = d[1:-1]
-        combined = c + "," + d
-        payload = "{" + combined + "}"
-        payload = json.loads(payload)
-    data = payload
+    data = _vsphere_storage_data(name,reg_id,ds_id,encrypted,sharelevel,diskmode,tag_key,iops_limit,tag_value,shares,provision_type,default,disktype,policy_id)
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
     if response.status_code == 201:
         print('Successfully Created vSphere Storage Profile')
+        _invalidate_index(url,username,'tags:storage_profile')
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
     else:
@@ -2256,7 +3057,35 @@ def create_vsphere_storage_profile(url,username,password,name,region_name,datast
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
 
-def create_aws_storage_profile(url,username,password,name,region_name,encrypted="false",devicetype="ebs",volumetype="standard",tag_key=None,iops_limit=None,tag_value=None,default="false"):
+def _aws_storage_data(name,reg_id,encrypted="false",devicetype="ebs",volumetype="standard",tag_key=None,iops_limit=None,tag_value=None,default="false"):
+    data = {
+              "deviceType": devicetype,
+              "volumeType": volumetype,
+              "supportsEncryption": encrypted,
+              "regionId": reg_id,
+              "name": name,
+              "description": "AWS Storage Profile",
+              "defaultItem": default,
+              "tags": _storage_tags(tag_key,tag_value)
+            }
+    if iops_limit != None:
+        data["limitIops"] = iops_limit
+    return data
+
+def _azure_storage_data(name,reg_id,encrypted="false",disktype="Standard_LRS",diskcaching="None",oscaching="None",tag_key=None,tag_value=None,default="false"):
+    return {
+             "supportsEncryption": encrypted,
+             "regionId": reg_id,
+             "name": name,
+             "description": "Azure Storage Profile",
+             "defaultItem": default,
+             "diskType": disktype,
+             "dataDiskCaching": diskcaching,
+             "osDiskCaching": oscaching,
+             "tags": _storage_tags(tag_key,tag_value)
+           }
+
+def create_aws_storage_profile(url,username,password,name,region_name,encrypted="false",devicetype="ebs",volumetype="standard",tag_key=None,iops_limit=None,tag_value=None,default="false",caname=None):
     """
     Creates a AWS Storage Profile
 
@@ -2285,42 +3114,19 @@ def create_aws_storage_profile(url,username,password,name,region_name,encrypted=
     iops_limit = Sets the IOPs limit for the Storage profile (if not set value is set to unlimited)
 
     default = Is this the default profile for the region (true / false (default))
+
+    caname = Name of the Cloud Account owning the region (only needed when several Cloud Accounts share the region)
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
-    reg_id = get_cloud_regionid_by_name(url,username,password,region_name)
-    if tag_key != None:
-        if tag_value != None:
-            tag_prep = {"key": tag_key,"value": tag_value}
-            tag = []
-            tag.append(tag_prep)
-    else:
-        tag = []
+    reg_id = get_cloud_regionid_by_name(url,username,password,region_name,caname)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/storage-profiles-aws'.format(api_url_base)
-    payload = {
-                  "deviceType": devicetype,
-                  "volumeType": volumetype,
-                  "supportsEncryption": encrypted,
-                  "regionId": reg_id,
-                  "name": name,
-                  "description": "AWS Storage Profile",
-                  "defaultItem": default,
-                  "tags": tag
-                }
-    if iops_limit != None:
-        c = json.dumps(payload)
-        c = c[1:-1]
-        iops = {"limitIops": iops_limit}
-        d = json.dumps(iops)
-        d = d[1:-1]
-        combined = c + "," + d
-        payload = "{" + combined + "}"
-        payload = json.loads(payload)
-    data = payload
+    data = _aws_storage_data(name,reg_id,encrypted,devicetype,volumetype,tag_key,iops_limit,tag_value,default)
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
     if response.status_code == 201:
         print('Successfully Created AWS Storage Profile')
+        _invalidate_index(url,username,'tags:storage_profile')
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
     else:
@@ -2328,7 +3134,7 @@ def create_aws_storage_profile(url,username,password,name,region_name,encrypted=
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
 
-def create_azure_storage_profile(url,username,password,name,region_name,encrypted="false",disktype="Standard_LRS",diskcaching="None",oscaching="None",tag_key=None,tag_value=None,default="false"):
+def create_azure_storage_profile(url,username,password,name,region_name,encrypted="false",disktype="Standard_LRS",diskcaching="None",oscaching="None",tag_key=None,tag_value=None,default="false",caname=None):
     """
     Creates a Azure Storage Profile
 
@@ -2357,33 +3163,19 @@ def create_azure_storage_profile(url,username,password,name,region_name,encrypte
     tag_value = Th value for the tag (i.e. tag_key:azure)
 
     default = Is this the default profile for the region (true / false (default))
+
+    caname = Name of the Cloud Account owning the region (only needed when several Cloud Accounts share the region)
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
-    reg_id = get_cloud_regionid_by_name(url,username,password,region_name)
-    if tag_key != None:
-        if tag_value != None:
-            tag_prep = {"key": tag_key,"value": tag_value}
-            tag = []
-            tag.append(tag_prep)
-    else:
-        tag = []
+    reg_id = get_cloud_regionid_by_name(url,username,password,region_name,caname)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}iaas/api/storage-profiles-azure'.format(api_url_base)
-    data = {
-             "supportsEncryption": encrypted,
-             "regionId": reg_id,
-             "name": name,
-             "description": "Azure Storage Profile",
-             "defaultItem": default,
-             "diskType": disktype,
-             "dataDiskCaching": diskcaching,
-             "osDiskCaching": oscaching,
-             "tags": tag
-           }
+    data = _azure_storage_data(name,reg_id,encrypted,disktype,diskcaching,oscaching,tag_key,tag_value,default)
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
     if response.status_code == 201:
         print('Successfully Created Azure Storage Profile')
+        _invalidate_index(url,username,'tags:storage_profile')
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
     else:
@@ -2391,8 +3183,278 @@ def create_azure_storage_profile(url,username,password,name,region_name,encrypte
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
 
+_STORAGE_TYPES = {
+    "aws": (_aws_storage_data, "iaas/api/storage-profiles-aws", "AWS"),
+    "azure": (_azure_storage_data, "iaas/api/storage-profiles-azure", "Azure")
+}
+
+def _create_storage_in_region(api_url,headers,existing,data,region_name):
+    result = {"name": data['name'], "region_name": region_name}
+    current = existing.get((data['regionId'], data['name']))
+    if current != None:
+        current = dict(current, tags=current.get('tags') or [])
+        desired = dict((k, v) for k, v in data.items() if k != "regionId")
+        changes = _diff_fields(desired, current)
+        if changes:
+            result.update(status="conflict", id=current['id'], changes=changes)
+        else:
+            result.update(status="unchanged", id=current['id'])
+        return result
+    try:
+        response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
+        json_data = json.loads(response.content.decode('utf-8'))
+    except Exception as exc:
+        result.update(status="failed", error=str(exc))
+        return result
+    if response.status_code == 201:
+        result.update(status="created", id=json_data['id'])
+    else:
+        result.update(status="failed", error=json_data)
+    return result
+
+def create_storage_profiles(url,username,password,cloud_type,profile,regions,caname=None,max_workers=8):
+    """
+    Creates the same AWS or Azure Storage Profile (storage tier) in many regions.
+    Regions are resolved from one cached listing and regions that already hold an identical profile are skipped.
+    A profile with the same name but other settings is reported as a conflict and left untouched.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin user
+
+    password = vRA Admin password
+
+    cloud_type = Type of the Storage Profiles (aws / azure)
+
+    profile = Storage tier with name and any option of create_aws_storage_profile / create_azure_storage_profile
+    (i.e. {"name": "gold", "volumetype": "io1", "iops_limit": 1000, "tag_key": "tier", "tag_value": "gold"})
+
+    regions = List of region names the profile is created in (i.e. ["us-west-1", "us-east-1"])
+
+    caname = Name of the Cloud Account owning the regions (only needed when several Cloud Accounts share the regions)
+
+    max_workers = Maximum number of Storage Profiles created at the same time (default is 8)
+    """
+    if cloud_type not in _STORAGE_TYPES:
+        print("Unsupported Storage Profile type: " + str(cloud_type))
+        return "Unsupported Storage Profile type: " + str(cloud_type)
+    builder, path, label = _STORAGE_TYPES[cloud_type]
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    api_url = '{0}{1}'.format(api_url_base,path)
+    spec = dict(profile)
+    name = spec.pop('name')
+    results = []
+    payloads = []
+    for region_name in regions:
+        region = get_region(url,username,password,region_name,caname)
+        if not isinstance(region, dict):
+            results.append({"name": name, "region_name": region_name, "status": "failed", "error": region})
+            continue
+        try:
+            payloads.append((region_name, builder(name,region['id'],**spec)))
+        except TypeError as exc:
+            results.append({"name": name, "region_name": region_name, "status": "failed", "error": str(exc)})
+    existing = {}
+    if payloads:
+        for sp in _iaas_get_all(api_url, headers):
+            existing[(_region_id_of(sp), sp['name'])] = sp
+    results.extend(_run_concurrently(lambda item: _create_storage_in_region(api_url,headers,existing,item[1],item[0]), payloads, max_workers))
+    order = dict((region_name, n) for n, region_name in enumerate(regions))
+    results.sort(key=lambda x: order[x['region_name']])
+    created = len([x for x in results if x['status'] == "created"])
+    unchanged = len([x for x in results if x['status'] == "unchanged"])
+    if created:
+        _invalidate_index(url,username,'tags:storage_profile')
+    print('Created ' + str(created) + ' ' + label + ' Storage Profiles, ' + str(unchanged) + ' already up to date, ' + str(len(results) - created - unchanged) + ' not created')
+    return results
+
 ######Integrations######
-def create_actions_content_source(url,username,password,name,int_name,proj_name,repo,branch,path):
+def _latest_sync(api_url_base,headers,source_id):
+    history = _paged_get_all('{0}content/api/sources/{1}/sync-history'.format(api_url_base,source_id), headers, page_size=20)
+    if not history:
+        return None
+    return max(history, key=lambda x: x.get('syncedAt') or x.get('createdAt') or '')
+
+def _wait_for_sync(api_url_base,headers,source_id,timeout=900,interval=2,max_interval=30,since=None):
+    """
+    Poll the sync history of a content source until a sync newer than since has finished, backing off like
+    _deployment_transitions while its status does not change
+    """
+    start = time.time()
+    delay = interval
+    status = None
+    while True:
+        try:
+            sync = _latest_sync(api_url_base,headers,source_id)
+        except requests.exceptions.RequestException as exc:
+            log.debug('Polling content source %s failed: %s', source_id, exc)
+            sync = None
+        current = None
+        if sync != None and (since == None or (sync.get('syncedAt') or sync.get('createdAt') or '') > since):
+            current = sync.get('status')
+        if current != None and current not in SYNC_RUNNING_STATES:
+            return {"id": source_id, "status": current, "seconds": round(time.time() - start, 1), "details": sync}
+        if current != status:
+            status = current
+            delay = interval
+        else:
+            delay = min(delay * 1.5, max_interval)
+        if time.time() - start + delay > timeout:
+            return {"id": source_id, "status": "TIMEOUT", "seconds": round(time.time() - start, 1), "details": sync}
+        time.sleep(delay)
+
+def _get_content_source(api_url_base,headers,name,proj_id=None):
+    for source in _paged_get_all('{0}content/api/sources'.format(api_url_base), headers):
+        if source['name'] == name and (proj_id == None or source.get('projectId') == proj_id):
+            return source
+    return None
+
+def _sync_source(api_url_base,headers,source_id,wait=True,timeout=900):
+    previous = _latest_sync(api_url_base,headers,source_id)
+    since = (previous.get('syncedAt') or previous.get('createdAt')) if previous else None
+    response = requests.post('{0}content/api/sources/{1}/sync'.format(api_url_base,source_id), headers=headers, verify=False)
+    if response.status_code not in (200, 201, 202, 204):
+        return {"id": source_id, "status": "FAILED", "details": json.loads(response.content.decode('utf-8') or '{}')}
+    if not wait:
+        return {"id": source_id, "status": "REQUESTED"}
+    return _wait_for_sync(api_url_base,headers,source_id,timeout,since=since)
+
+def sync_content_source(url,username,password,name,proj_name=None,wait=True,timeout=900):
+    """
+    Triggers a sync of a content source and waits until its content is imported
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin user
+
+    password = vRA Admin password
+
+    name = Name of the content source
+
+    proj_name = Name of the vRA Project of the content source (only needed when several projects use the name)
+
+    wait = Wait until the import has finished and return its status (default is True)
+
+    timeout = Seconds to wait for the import (default is 900)
+    """
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    proj_id = None
+    if proj_name != None:
+        proj_json = get_proj_by_name(url,username,password,proj_name)
+        if not isinstance(proj_json, dict):
+            return "No Match Found For Project: " + proj_name
+        proj_id = proj_json['id']
+    source = _get_content_source(api_url_base,headers,name,proj_id)
+    if source == None:
+        print("No Match Found For Content Source: " + name)
+        return "No Match Found For Content Source: " + name
+    result = _sync_source(api_url_base,headers,source['id'],wait,timeout)
+    print('Content Source ' + name + ' sync status ' + str(result['status']))
+    return result
+
+_CONTENT_TYPES = {
+    "blueprint": "blueprint",
+    "templates": "blueprint",
+    "actions": "abx_scripts",
+    "abx_scripts": "abx_scripts"
+}
+
+def create_content_sources(url,username,password,sources,wait=True,timeout=900,max_workers=8):
+    """
+    Creates many GitHub content sources across projects and repositories at once and waits until their content
+    is imported, so templates and actions can be used right away. Projects and integrations are resolved once,
+    sources that already exist are synced instead.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin user
+
+    password = vRA Admin password
+
+    sources = List of content sources with name, int_name, proj_name, repo, branch, path and content_type
+    (blueprint / actions) (i.e. [{"name": "Dev Templates", "int_name": "ABC GitHub", "proj_name": "Dev",
+    "repo": "mcclanc/vra8-content", "branch": "master", "path": "templates", "content_type": "blueprint"}])
+
+    wait = Wait until every import has finished (default is True)
+
+    timeout = Seconds to wait for each import when wait is set (default is 900)
+
+    max_workers = Maximum number of content sources created at the same time (default is 8)
+    """
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    api_url = '{0}content/api/sources'.format(api_url_base)
+    results = [None] * len(sources)
+    specs = []
+    for n, spec in enumerate(sources):
+        missing = [x for x in ("name", "int_name", "proj_name", "repo", "path") if not isinstance(spec, dict) or spec.get(x) == None]
+        if missing:
+            name = spec.get('name') if isinstance(spec, dict) else None
+            results[n] = {"name": name, "status": "failed", "error": "Content source is missing " + ", ".join(missing)}
+        else:
+            specs.append((n, spec))
+    proj_ids = dict((x['name'], x['id']) for x in _iaas_get_all('{0}iaas/api/projects'.format(api_url_base), headers))
+    int_ids = {}
+    for int_name in set(x[1]['int_name'] for x in specs):
+        int_ids[int_name] = get_integration_by_name(url,username,password,int_name)
+    existing = dict(((x['name'], x.get('projectId')), x) for x in _paged_get_all(api_url, headers))
+    def run(spec):
+        result = {"name": spec['name'], "proj_name": spec['proj_name']}
+        if spec['proj_name'] not in proj_ids:
+            result.update(status="failed", error="No Match Found For Project: " + spec['proj_name'])
+            return result
+        if not isinstance(int_ids.get(spec['int_name']), str):
+            result.update(status="failed", error="No Match Found For Integration: " + spec['int_name'])
+            return result
+        content_type = _CONTENT_TYPES.get(spec.get('content_type', 'blueprint'), spec.get('content_type'))
+        try:
+            current = existing.get((spec['name'], proj_ids[spec['proj_name']]))
+            if current != None:
+                result.update(status="exists", id=current['id'])
+                result["sync"] = _sync_source(api_url_base,headers,current['id'],wait,timeout)
+                return result
+            data =  {
+                      "name": spec['name'],
+                      "typeId": "com.github",
+                      "syncEnabled" : "true",
+                      "projectId" : proj_ids[spec['proj_name']],
+                      "config": {
+                        "integrationId" : int_ids[spec['int_name']],
+                        "repository" : spec['repo'],
+                        "path" : spec['path'],
+                        "branch" : spec.get('branch', 'master'),
+                        "contentType" : content_type
+                      }
+                    }
+            response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
+            json_data = json.loads(response.content.decode('utf-8') or '{}')
+            if response.status_code != 201:
+                result.update(status="failed", error=json_data)
+                return result
+            result.update(status="created", id=json_data['id'])
+            if wait:
+                result["sync"] = _wait_for_sync(api_url_base,headers,json_data['id'],timeout)
+        except Exception as exc:
+            result.update(status="failed", error=str(exc))
+        return result
+    for (n, spec), result in zip(specs, _run_concurrently(lambda x: run(x[1]), specs, max_workers)):
+        results[n] = result
+    imported = len([x for x in results if x.get('sync', {}).get('status') not in (None, "FAILED", "TIMEOUT", "REQUESTED")])
+    print('Content Sources: ' + str(len([x for x in results if x['status'] == "created"])) + ' created, ' + str(imported) + ' imported, ' + str(len([x for x in results if x['status'] == "failed"])) + ' failed')
+    return results
+
+def create_actions_content_source(url,username,password,name,int_name,proj_name,repo,branch,path,wait=False,timeout=900):
     """
     Creates an action content source on a github integration
 
@@ -2411,11 +3473,15 @@ def create_actions_content_source(url,username,password,name,int_name,proj_name,
 
     proj_name = Name of vRA Project to associate content source
 
-    repo = Name of the github repository
+    repo = Name of the github repository (i.e. mcclanc/vra8-content)
 
     branch = Name of branch in repo (i.e. master)
 
     path = path to folder of actions (i.e actions)
+
+    wait = Wait until the first import of the content source has finished and return its status (default is False)
+
+    timeout = Seconds to wait for the import when wait is set (default is 900)
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
@@ -2431,14 +3497,18 @@ def create_actions_content_source(url,username,password,name,int_name,proj_name,
               "projectId" : proj_id,
               "config": {
                 "integrationId" : int_id,
-                "repository" : "mcclanc/vra8-content",
+                "repository" : repo,
                 "path" : path,
-                "branch" : "master",
+                "branch" : branch,
                 "contentType" : "abx_scripts"
               }
             }
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 201:
+    if response.status_code == 201 and wait:
+        sync = _wait_for_sync(api_url_base,headers,json.loads(response.content.decode('utf-8'))['id'],timeout)
+        print('Content Source ' + name + ' import finished with status ' + str(sync['status']))
+        return sync
+    elif response.status_code == 201:
         print('Successfully Created Actions Content Source')
         return 'Successfully Created Actions Content Source'
     else:
@@ -2446,7 +3516,7 @@ def create_actions_content_source(url,username,password,name,int_name,proj_name,
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
 
-def create_blueprint_content_source(url,username,password,name,int_name,proj_name,repo,branch,path):
+def create_blueprint_content_source(url,username,password,name,int_name,proj_name,repo,branch,path,wait=False,timeout=900):
     """
     Creates a cloud template content source on a github integration
 
@@ -2464,11 +3534,15 @@ def create_blueprint_content_source(url,username,password,name,int_name,proj_nam
 
     proj_name = Name of vRA Project to associate content source
 
-    repo = Name of the github repository
+    repo = Name of the github repository (i.e. mcclanc/vra8-content)
 
     branch = Name of branch in repo (i.e. master)
 
     path = Folder name storing cloud templates in repo (i.e templates)
+
+    wait = Wait until the first import of the content source has finished and return its status (default is False)
+
+    timeout = Seconds to wait for the import when wait is set (default is 900)
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
@@ -2484,14 +3558,18 @@ def create_blueprint_content_source(url,username,password,name,int_name,proj_nam
               "projectId" : proj_id,
               "config": {
                 "integrationId" : int_id,
-                "repository" : "mcclanc/vra8-content",
+                "repository" : repo,
                 "path" : path,
-                "branch" : "master",
+                "branch" : branch,
                 "contentType" : "blueprint"
               }
             }
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 201:
+    if response.status_code == 201 and wait:
+        sync = _wait_for_sync(api_url_base,headers,json.loads(response.content.decode('utf-8'))['id'],timeout)
+        print('Content Source ' + name + ' import finished with status ' + str(sync['status']))
+        return sync
+    elif response.status_code == 201:
         print('Successfully Created Blueprint Content Source')
         return 'Successfully Created Blueprint Content Source'
     else:
@@ -2522,6 +3600,7 @@ def delete_storage_profile(url,username,password,storage_profile_name):
     response = requests.delete(api_url, headers=headers, verify=False)
     if response.status_code == 204:
         print('Successfully Deleted Storage Profile: ' + storage_profile_name)
+        _invalidate_index(url,username,'tags:storage_profile')
         return 'Successfully Deleted Storage Profile: ' + storage_profile_name
     else:
         print(response.status_code)
@@ -2529,6 +3608,34 @@ def delete_storage_profile(url,username,password,storage_profile_name):
         return json_data
 
 ######Blueprint Version and Release######
+def _template_index(url,username,password,refresh=False):
+    """
+    Index of every cloud template (blueprint) keyed by name, a name can exist once per project
+    """
+    def build():
+        api_url_base = set_bas_url(url)
+        access_key = get_token(url,username, password)
+        headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+        index = {}
+        for template in _paged_get_all('{0}blueprint/api/blueprints'.format(api_url_base), headers):
+            index.setdefault(template['name'], []).append(template)
+        return index
+    return _cached_index(url,username,'blueprints',build,refresh)
+
+def _find_template(url,username,password,template_name,proj_id=None):
+    """
+    Look the template up in the template index, reading vRA again once when it is not found
+    """
+    for refresh in (False, True):
+        templates = _template_index(url,username,password,refresh).get(template_name, [])
+        if proj_id != None:
+            templates = [x for x in templates if x.get('projectId') == proj_id]
+        if len(templates) == 1:
+            return templates[0]
+        if len(templates) > 1:
+            return "Cloud Template " + template_name + " exists in several projects, provide the project"
+    return "No Match Found For Cloud Template: " + template_name
+
 def get_template_by_name(url,username,password,template_name):
     """
     Finds the cloud template by name and returns information via json
@@ -2543,36 +3650,73 @@ def get_template_by_name(url,username,password,template_name):
 
     template_name = Name of the cloud template to find
     """
-    api_url_base = set_bas_url(url)
-    access_key = get_token(url,username, password)
-    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
-    api_url = '{0}blueprint/api/blueprints'.format(api_url_base)
-    response = requests.get(api_url, headers=headers, verify=False)
-    if response.status_code == 200:
-        json_data = json.loads(response.content.decode('utf-8'))
-        n = 0
-        end_n = json_data['totalElements']
-        end_n = end_n - 1
-        while True:
-            templt_name = json_data['content'][n]['name']
-            if templt_name == template_name:
-                print("Found Cloud Template: " + template_name)
-                template_id = json_data['content'][n]
-                return template_id
-                break
-            elif n < end_n:
-                n = n + 1
-            elif n >= end_n:
-                print("No Match Found For Cloud Template: " + template_name)
-                break
+    template_json = _find_template(url,username,password,template_name)
+    if isinstance(template_json, dict):
+        print("Found Cloud Template: " + template_name)
     else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+        print(template_json)
+    return template_json
+
+def _content_hash(content):
+    """
+    sha256 of template content, ignoring trailing whitespace and line ending differences
+    """
+    lines = [x.rstrip() for x in (content or "").replace('\r\n', '\n').split('\n')]
+    return hashlib.sha256('\n'.join(lines).strip('\n').encode('utf-8')).hexdigest()
+
+def _next_version(version):
+    if version == None:
+        return "1"
+    parts = str(version).split('.')
+    if parts[-1].isdigit():
+        parts[-1] = str(int(parts[-1]) + 1)
+        return '.'.join(parts)
+    return str(version) + '.1'
+
+def _version_template(api_url_base,headers,template_id,version=None,release=False,change_log=None,force=False):
+    """
+    Create (and release) a version of a template unless its latest version already holds the same content.
+    The content hash is stored in the version description so the next run can compare without reading the content.
+    """
+    result = {"id": template_id}
+    base = '{0}blueprint/api/blueprints/{1}'.format(api_url_base,template_id)
+    response = requests.get(base, headers=headers, verify=False)
+    response.raise_for_status()
+    content_hash = _content_hash(json.loads(response.content.decode('utf-8')).get('content'))
+    versions = _paged_get_all(base + '/versions', headers)
+    latest = max(versions, key=lambda x: x.get('createdAt') or '') if versions else None
+    result["hash"] = content_hash
+    if latest != None and not force:
+        latest_hash = None
+        match = re.search(r'sha256:([0-9a-f]{64})', latest.get('description') or '')
+        if match:
+            latest_hash = match.group(1)
+        else:
+            response = requests.get(base + '/versions/' + str(latest['version']), headers=headers, verify=False)
+            response.raise_for_status()
+            latest_hash = _content_hash(json.loads(response.content.decode('utf-8')).get('content'))
+        if latest_hash == content_hash:
+            result.update(status="unchanged", version=latest.get('version'))
+            return result
+    if version == None:
+        version = _next_version(latest.get('version') if latest else None)
+    version = str(version)
+    data =  {
+              "changeLog": change_log or "",
+              "description": "Created version " + version + " of Template sha256:" + content_hash,
+              "release": release,
+              "version": version
+            }
+    response = requests.post(base + '/versions', headers=headers, data=json.dumps(data), verify=False)
+    if response.status_code == 201:
+        result.update(status="created", version=version)
+    else:
+        result.update(status="failed", version=version, error=json.loads(response.content.decode('utf-8') or '{}'))
+    return result
 
-def create_template_version(url,username,password,template_name,version,release="false",change_log=None):
+def create_template_version(url,username,password,template_name,version,release="false",change_log=None,force=False):
     """
-    Creates a version of the cloud template
+    Creates a version of the cloud template, unless the latest version already has the same content
 
     Arguments:
 
@@ -2589,29 +3733,91 @@ def create_template_version(url,username,password,template_name,version,release=
     release = Release the version to the Service Broker catalog (true / false (default))
 
     change_log = Description of changes to template (if not included the change log is left blank)
+
+    force = Create the version even when the content did not change since the latest version (default is False)
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     template_json = get_template_by_name(url,username,password,template_name)
-    template_id = template_json['id']
-    api_url = '{0}blueprint/api/blueprints/{1}/versions'.format(api_url_base,template_id)
-    if change_log == None:
-        change_log = ""
-    data =  {
-              "changeLog": change_log,
-              "description": "Created version " + version + " of Template",
-              "release": release,
-              "version": version
-            }
-    response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 201:
+    if not isinstance(template_json, dict):
+        return template_json
+    result = _version_template(api_url_base,headers,template_json['id'],version,str(release).lower() == "true",change_log,force)
+    if result['status'] == "created":
         print('Successfully Created Version of Cloud Template')
         return 'Successfully Created Version of Cloud Template'
+    elif result['status'] == "unchanged":
+        print('Cloud Template ' + template_name + ' is unchanged since version ' + str(result['version']))
+        return 'Cloud Template ' + template_name + ' is unchanged since version ' + str(result['version'])
     else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+        print('Failed to Create Version of Cloud Template')
+        return result['error']
+
+def version_templates(url,username,password,templates,version=None,release=False,change_log=None,max_workers=8):
+    """
+    Creates a version of many cloud templates at once, skipping every template whose content did not change
+    since its latest version. Templates are resolved from one paged listing.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin user
+
+    password = vRA Admin password
+
+    templates = List of template names, or dicts with name and optional proj_name / version / change_log
+    (i.e. ["centos", {"name": "ubuntu", "proj_name": "Dev", "version": "2.0"}])
+
+    version = Version for every template (if not set the last number of the latest version is increased, i.e. 1.4 -> 1.5)
+
+    release = Release the new versions to the Service Broker catalog (default is False)
+
+    change_log = Description of changes used for every template
+
+    max_workers = Maximum number of templates versioned at the same time (default is 8)
+    """
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    specs = [x if isinstance(x, dict) else {"name": x} for x in templates]
+    proj_ids = {}
+    for proj_name in set(x['proj_name'] for x in specs if x.get('proj_name')):
+        proj_json = get_proj_by_name(url,username,password,proj_name)
+        proj_ids[proj_name] = proj_json['id'] if isinstance(proj_json, dict) else None
+    def run(spec):
+        result = {"name": spec['name']}
+        if spec.get('proj_name') and proj_ids[spec['proj_name']] == None:
+            result.update(status="failed", error="No Match Found For Project: " + spec['proj_name'])
+            return result
+        template = _find_template(url,username,password,spec['name'],proj_ids.get(spec.get('proj_name')))
+        if not isinstance(template, dict):
+            result.update(status="failed", error=template)
+            return result
+        try:
+            result.update(_version_template(api_url_base,headers,template['id'],spec.get('version', version),release,spec.get('change_log', change_log)))
+        except Exception as exc:
+            result.update(status="failed", error=str(exc))
+        return result
+    results = _run_concurrently(run, specs, max_workers)
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    print('Versioned Cloud Templates: ' + ", ".join(k + ' ' + str(v) for k, v in sorted(counts.items())))
+    return results
+
+def _template_version_action(api_url_base,headers,template_id,version,action):
+    """
+    Release or unrelease one template version, returning None on success or the error
+    """
+    api_url = '{0}blueprint/api/blueprints/{1}/versions/{2}/actions/{3}'.format(api_url_base,template_id,version,action)
+    try:
+        response = requests.post(api_url, headers=headers, verify=False)
+    except requests.exceptions.RequestException as exc:
+        return str(exc)
+    if response.status_code == 200:
+        return None
+    return json.loads(response.content.decode('utf-8') or '{}')
 
 def release_template_version(url,username,password,template_name,version):
     """
@@ -2633,16 +3839,133 @@ def release_template_version(url,username,password,template_name,version):
     access_key = get_token(url,username, password)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     template_json = get_template_by_name(url,username,password,template_name)
-    template_id = template_json['id']
-    api_url = '{0}blueprint/api/blueprints/{1}/versions/{2}/actions/release'.format(api_url_base,template_id,version)
-    response = requests.post(api_url, headers=headers, verify=False)
-    if response.status_code == 200:
+    if not isinstance(template_json, dict):
+        return template_json
+    error = _template_version_action(api_url_base,headers,template_json['id'],version,"release")
+    if error == None:
         print('Successfully Released Version of Cloud Template to Catalog')
         return 'Successfully Released Version of Cloud Template to Catalog'
     else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+        print('Failed to Release Version of Cloud Template')
+        return error
+
+def release_template_versions(url,username,password,versions=None,proj_name=None,unrelease=False,rollback=False,max_workers=8):
+    """
+    Releases (or unreleases) many cloud template versions at once. Either list the versions, or give only
+    proj_name to release the latest version of every template of the project. Templates are resolved from one
+    paged listing and the releases run concurrently.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin user
+
+    password = vRA Admin password
+
+    versions = List of [template_name, version] pairs or dicts with name, version and optional proj_name
+    (i.e. [["centos", "1.2"], {"name": "ubuntu", "version": "2.0", "proj_name": "Dev"}])
+
+    proj_name = Project of the listed templates, or without versions the project whose latest versions are released
+
+    unrelease = Unrelease the versions from the catalog instead of releasing them (default is False)
+
+    rollback = When any version fails, undo the versions this call changed so the catalog is left as it was (default is False).
+    Versions already released (or unreleased) are reported as unchanged and never rolled back.
+
+    max_workers = Maximum number of versions released at the same time (default is 8)
+    """
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    action, undo = ("unrelease", "release") if unrelease else ("release", "unrelease")
+    proj_ids = {}
+    specs = []
+    for item in versions or []:
+        if isinstance(item, dict):
+            specs.append(dict(item))
+        else:
+            specs.append({"name": item[0], "version": item[1]})
+    for spec in specs:
+        spec.setdefault('proj_name', proj_name)
+        if spec.get('version') is not None:
+            spec['version'] = str(spec['version'])
+    for name in set([x['proj_name'] for x in specs if x['proj_name']] + ([proj_name] if proj_name else [])):
+        proj_json = get_proj_by_name(url,username,password,name)
+        if not isinstance(proj_json, dict):
+            return "No Match Found For Project: " + name
+        proj_ids[name] = proj_json['id']
+    results = []
+    jobs = []
+    if versions == None:
+        if proj_name == None:
+            return 'Provide versions or proj_name'
+        for templates in _template_index(url,username,password,True).values():
+            for template in templates:
+                if template.get('projectId') == proj_ids[proj_name]:
+                    jobs.append({"name": template['name'], "version": None, "id": template['id']})
+    else:
+        for spec in specs:
+            template = _find_template(url,username,password,spec['name'],proj_ids.get(spec['proj_name']))
+            if isinstance(template, dict):
+                jobs.append({"name": spec['name'], "version": spec['version'], "id": template['id']})
+            else:
+                results.append({"name": spec['name'], "version": spec['version'], "status": "failed", "error": template})
+    def resolve(job):
+        """
+        Read the versions of the template to find the latest version (when not given) and the status of the version
+        before this call
+        """
+        try:
+            template_versions = _paged_get_all('{0}blueprint/api/blueprints/{1}/versions'.format(api_url_base,job['id']), headers)
+        except Exception as exc:
+            job['error'] = str(exc)
+            return job
+        if job['version'] == None and template_versions:
+            job['version'] = max(template_versions, key=lambda x: x.get('createdAt') or '')['version']
+        for template_version in template_versions:
+            if template_version.get('version') == job['version']:
+                job['prior'] = template_version.get('status')
+        return job
+    jobs = _run_concurrently(resolve, jobs, max_workers)
+    pending = []
+    for job in jobs:
+        if 'error' in job:
+            results.append({"name": job['name'], "version": job['version'], "status": "failed", "error": job['error']})
+        elif job['version'] == None:
+            results.append({"name": job['name'], "status": "skipped", "error": "No versions"})
+        elif 'prior' not in job:
+            results.append({"name": job['name'], "version": job['version'], "status": "failed", "error": "No Match Found For Version: " + str(job['version'])})
+        elif (job['prior'] == "RELEASED") == (action == "release"):
+            results.append({"name": job['name'], "version": job['version'], "status": "unchanged"})
+        else:
+            pending.append(job)
+    jobs = pending
+    def run(job):
+        error = _template_version_action(api_url_base,headers,job['id'],job['version'],action)
+        if error == None:
+            return {"name": job['name'], "version": job['version'], "status": action + "d"}
+        return {"name": job['name'], "version": job['version'], "status": "failed", "error": error}
+    if rollback and any(x['status'] == "failed" for x in results):
+        jobs_done = [{"name": x['name'], "version": x['version'], "status": "skipped", "error": "Not run, other versions could not be resolved"} for x in jobs]
+        jobs = []
+    else:
+        jobs_done = []
+    done = _run_concurrently(run, jobs, max_workers)
+    results.extend(done + jobs_done)
+    if rollback and any(x['status'] == "failed" for x in results):
+        succeeded = [(job, result) for job, result in zip(jobs, done) if result['status'] != "failed"]
+        undone = _run_concurrently(lambda x: _template_version_action(api_url_base,headers,x[0]['id'],x[0]['version'],undo), succeeded, max_workers)
+        for (job, result), error in zip(succeeded, undone):
+            if error == None:
+                result['status'] = "rolled_back"
+            else:
+                result.update(status="rollback_failed", error=error)
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    print('Cloud Template versions: ' + ", ".join(k + ' ' + str(v) for k, v in sorted(counts.items())))
+    return results
 
 def delete_template(url,username,password,template_name):
     """
@@ -2666,6 +3989,7 @@ def delete_template(url,username,password,template_name):
     api_url = '{0}blueprint/api/blueprints/{1}'.format(api_url_base,temp_id)
     response = requests.delete(api_url, headers=headers, verify=False)
     if response.status_code == 204:
+        _invalidate_index(url,username,'blueprints')
         print('Successfully Deleted Cloud Template: ' + template_name)
         return 'Successfully Deleted Cloud Template: ' + template_name
     else:
@@ -2674,9 +3998,10 @@ def delete_template(url,username,password,template_name):
         return json_data
 
 ##########Service Broker##########
-def create_sb_content_source(url,username,password,name,proj_name,content_type):
+def create_sb_content_source(url,username,password,name=None,proj_name=None,content_type=None,content_source_name=None):
     """
-    Creates Content Source in Service Broker
+    Creates Content Source in Service Broker. Entitling a project to a content source is done by create_sb_entitlement,
+    an older style call with proj_name and content_source_name is passed on to it.
 
     Arguments:
 
@@ -2691,7 +4016,15 @@ def create_sb_content_source(url,username,password,name,proj_name,content_type):
     proj_name = vRA Project name
 
     content_type = PIPELINE / TEMPLATE / ABX / VRO
+
+    content_source_name = Existing Content Source to entitle proj_name to (deprecated, use create_sb_entitlement)
     """
+    if content_source_name != None:
+        log.warning('create_sb_content_source called with content_source_name, entitling project %s to content source %s. Use create_sb_entitlement instead.', proj_name, content_source_name)
+        return create_sb_entitlement(url,username,password,proj_name,content_source_name)
+    if name == None or proj_name == None or content_type == None:
+        print('Provide name, proj_name and content_type (PIPELINE / TEMPLATE / ABX / VRO)')
+        return 'Provide name, proj_name and content_type (PIPELINE / TEMPLATE / ABX / VRO)'
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
@@ -2715,6 +4048,7 @@ def create_sb_content_source(url,username,password,name,proj_name,content_type):
             }
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
     if response.status_code == 201:
+        _invalidate_index(url,username,'sb-sources')
         print('Successfully Created Service Broker Content Source: ' + name)
         return 'Successfully Created Actions Content Source: ' + name
     else:
@@ -2722,6 +4056,33 @@ def create_sb_content_source(url,username,password,name,proj_name,content_type):
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
 
+def _sb_source_index(url,username,password,refresh=False):
+    """
+    Index of every Service Broker content source keyed by name
+    """
+    def build():
+        api_url_base = set_bas_url(url)
+        access_key = get_token(url,username, password)
+        headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+        return dict((x['name'], x) for x in _paged_get_all('{0}catalog/api/admin/sources'.format(api_url_base), headers))
+    return _cached_index(url,username,'sb-sources',build,refresh)
+
+def _entitlement_index(url,username,password,refresh=False):
+    """
+    Set of (project id, content source id) pairs that already have an entitlement
+    """
+    def build():
+        api_url_base = set_bas_url(url)
+        access_key = get_token(url,username, password)
+        headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+        response = requests.get('{0}catalog/api/admin/entitlements'.format(api_url_base), headers=headers, verify=False)
+        response.raise_for_status()
+        json_data = json.loads(response.content.decode('utf-8'))
+        if isinstance(json_data, dict):
+            json_data = json_data.get('content', [])
+        return set((x.get('projectId'), x.get('definition', {}).get('id')) for x in json_data)
+    return _cached_index(url,username,'sb-entitlements',build,refresh)
+
 def get_sb_content_source_by_name(url,username,password,content_source_name):
     """
     Finds the Service Broker content source by name and returns information via json
@@ -2736,34 +4097,25 @@ def get_sb_content_source_by_name(url,username,password,content_source_name):
 
     content_source_name = The name used to create the content source in Service Broker
     """
-    api_url_base = set_bas_url(url)
-    access_key = get_token(url,username, password)
-    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
-    api_url = '{0}catalog/api/admin/sources'.format(api_url_base)
-    response = requests.get(api_url, headers=headers, verify=False)
-    if response.status_code == 200:
-        json_data = json.loads(response.content.decode('utf-8'))
-        n = 0
-        end_n = json_data['numberOfElements']
-        end_n = end_n - 1
-        while True:
-            source_name = json_data['content'][n]['name']
-            if source_name == content_source_name:
-                print("Found Content Source: " + content_source_name)
-                source_id = json_data['content'][n]
-                return source_id
-                break
-            elif n < end_n:
-                n = n + 1
-            elif n >= end_n:
-                print("No Match Found For Frabric Network: " + content_source_name)
-                break
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    for refresh in (False, True):
+        source = _sb_source_index(url,username,password,refresh).get(content_source_name)
+        if source != None:
+            print("Found Content Source: " + content_source_name)
+            return source
+    print("No Match Found For Content Source: " + content_source_name)
+    return "No Match Found For Content Source: " + content_source_name
+
+def _entitlement_data(proj_id,cs_id,content_source_name):
+    return {
+             "projectId": proj_id,
+             "definition": {
+               "id": cs_id,
+               "sourceName": content_source_name,
+               "type": "CatalogSourceIdentifier"
+             }
+           }
 
-def create_sb_content_source(url,username,password,proj_name,content_source_name):
+def create_sb_entitlement(url,username,password,proj_name,content_source_name):
     """
     Adds Entitlement to the Project for a Service Broker content source
 
@@ -2787,16 +4139,10 @@ def create_sb_content_source(url,username,password,proj_name,content_source_name
     cs_json = get_sb_content_source_by_name(url,username,password,content_source_name)
     cs_id = cs_json['id']
     api_url = '{0}catalog/api/admin/entitlements'.format(api_url_base)
-    data =  {
-              "projectId": proj_id,
-              "definition": {
-                "id": cs_id,
-                "sourceName": content_source_name,
-                "type": "CatalogSourceIdentifier"
-              }
-            }
+    data = _entitlement_data(proj_id,cs_id,content_source_name)
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
     if response.status_code == 201:
+        _invalidate_index(url,username,'sb-entitlements')
         print('Successfully Entitled Content Source: ' + content_source_name)
         return 'Successfully Entitled Content Source: ' + content_source_name
     else:
@@ -2804,6 +4150,71 @@ def create_sb_content_source(url,username,password,proj_name,content_source_name
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
 
+def entitle_content_sources(url,username,password,entitlements,max_workers=8):
+    """
+    Shares Service Broker content sources with many projects at once. Projects, content sources and existing
+    entitlements are each read once, entitlements that already exist are skipped.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin user
+
+    password = vRA Admin password
+
+    entitlements = Dict of content source name to the list of project names (or a single project name) to entitle, or a list of
+    [content_source_name, [project names]] pairs (i.e. {"Dev Templates": ["Dev", "QA"], "ABX Actions": "Ops"})
+
+    max_workers = Maximum number of entitlements created at the same time (default is 8)
+    """
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    api_url = '{0}catalog/api/admin/entitlements'.format(api_url_base)
+    if isinstance(entitlements, dict):
+        entitlements = list(entitlements.items())
+    entitlements = [(source_name, [projects] if isinstance(projects, str) else projects) for source_name, projects in entitlements]
+    proj_ids = dict((x['name'], x['id']) for x in _iaas_get_all('{0}iaas/api/projects'.format(api_url_base), headers))
+    sources = _sb_source_index(url,username,password)
+    if any(source_name not in sources for source_name, projects in entitlements):
+        sources = _sb_source_index(url,username,password,True)
+    entitled = _entitlement_index(url,username,password)
+    wanted = [(proj_ids.get(proj_name), sources[source_name]['id']) for source_name, projects in entitlements if source_name in sources for proj_name in projects]
+    if any(pair in entitled for pair in wanted):
+        entitled = _entitlement_index(url,username,password,True)
+    results = []
+    jobs = []
+    for source_name, projects in entitlements:
+        for proj_name in projects:
+            result = {"source": source_name, "proj_name": proj_name}
+            if source_name not in sources:
+                result.update(status="failed", error="No Match Found For Content Source: " + source_name)
+            elif proj_name not in proj_ids:
+                result.update(status="failed", error="No Match Found For Project: " + proj_name)
+            elif (proj_ids[proj_name], sources[source_name]['id']) in entitled:
+                result.update(status="exists")
+            else:
+                jobs.append((result, _entitlement_data(proj_ids[proj_name],sources[source_name]['id'],source_name)))
+            results.append(result)
+    def run(job):
+        result, data = job
+        try:
+            response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
+            if response.status_code in (200, 201):
+                result.update(status="created")
+                entitled.add((data['projectId'], data['definition']['id']))
+            else:
+                result.update(status="failed", error=json.loads(response.content.decode('utf-8') or '{}'))
+        except Exception as exc:
+            result.update(status="failed", error=str(exc))
+    _run_concurrently(run, jobs, max_workers)
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    print('Entitlements: ' + ", ".join(k + ' ' + str(v) for k, v in sorted(counts.items())))
+    return results
+
 def delete_sb_content_source(url,username,password,content_source_name):
     """
     Delete Service Broker Content Source
@@ -2826,6 +4237,8 @@ def delete_sb_content_source(url,username,password,content_source_name):
     api_url = '{0}catalog/api/admin/sources/{1}'.format(api_url_base,cs_id)
     response = requests.delete(api_url, headers=headers, verify=False)
     if response.status_code == 204:
+        _invalidate_index(url,username,'sb-sources')
+        _invalidate_index(url,username,'sb-entitlements')
         print('Successfully Deleted Service Broker Content Source: ' + content_source_name)
         return 'Successfully Deleted Service Broker Content Source: ' + content_source_name
     else:
@@ -2833,6 +4246,34 @@ def delete_sb_content_source(url,username,password,content_source_name):
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
 
+def _policy_index(url,username,password,refresh=False):
+    """
+    Index of every policy (with its definition) keyed by name, a name can exist once per project
+    """
+    def build():
+        api_url_base = set_bas_url(url)
+        access_key = get_token(url,username, password)
+        headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+        index = {}
+        for policy in _paged_get_all('{0}policy/api/policies'.format(api_url_base), headers, {"expandDefinition": "true"}):
+            index.setdefault(policy['name'], []).append(policy)
+        return index
+    return _cached_index(url,username,'policies',build,refresh)
+
+def _find_policy(url,username,password,polname,proj_id=None):
+    """
+    Look the policy up in the policy index, reading vRA again once when it is not found
+    """
+    for refresh in (False, True):
+        policies = _policy_index(url,username,password,refresh).get(polname, [])
+        if proj_id != None:
+            policies = [x for x in policies if x.get('projectId') == proj_id]
+        if len(policies) == 1:
+            return policies[0]
+        if len(policies) > 1:
+            return "Policy " + polname + " exists in several projects, provide the project"
+    return "No match found for policy: " + polname
+
 def get_polid_by_name(url,username,password,polname):
     """
     Retrieve Policy ID by name For Further Configurations
@@ -2847,33 +4288,12 @@ def get_polid_by_name(url,username,password,polname):
 
     polname = Policy Name
     """
-    api_url_base = set_bas_url(url)
-    access_key = get_token(url,username, password)
-    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
-    api_url = '{0}policy/api/policies'.format(api_url_base)
-    response = requests.get(api_url, headers=headers, verify=False)
-    if response.status_code == 200:
-        json_data = json.loads(response.content.decode('utf-8'))
-        n = 0
-        end_n = json_data['totalElements']
-        end_n = end_n - 1
-        while True:
-            pol_name = json_data['content'][n]['name']
-            if pol_name == polname:
-                print("Found Policy " + polname)
-                pl_id = json_data['content'][n]['id']
-                return pl_id
-                break
-            elif n < end_n:
-                n = n + 1
-            elif n >= end_n:
-                print("No match found for policy: " + polname)
-                return "No match found for policy: " + polname
-                break
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    policy = _find_policy(url,username,password,polname)
+    if isinstance(policy, dict):
+        print("Found Policy " + polname)
+        return policy['id']
+    print(policy)
+    return policy
 
 def delete_policy(url,username,password,polname):
     """
@@ -2890,12 +4310,13 @@ def delete_policy(url,username,password,polname):
     polname = Policy Name
     """
     api_url_base = set_bas_url(url)
-    access_key = get_token(url,username,password,czname)
+    access_key = get_token(url,username,password)
     pz_id = get_polid_by_name(url,username,password,polname)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}policy/api/policies/{1}'.format(api_url_base,pz_id)
     response = requests.delete(api_url, headers=headers, verify=False)
     if response.status_code == 204:
+        _invalidate_index(url,username,'policies')
         print("Successfully Deleted Policy: " + polname)
         return "Successfully Deleted Policy: " + polname
     else:
@@ -2921,33 +4342,281 @@ def get_catalog_item_by_name(url,username,password,item_name):
     access_key = get_token(url,username, password)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}catalog/api/items'.format(api_url_base)
-    response = requests.get(api_url, headers=headers, verify=False)
-    if response.status_code == 200:
-        json_data = json.loads(response.content.decode('utf-8'))
-        n = 0
-        end_n = json_data['numberOfElements']
-        end_n = end_n - 1
-        while True:
-            cat_name = json_data['content'][n]['name']
-            if cat_name == item_name:
+    try:
+        for item in _paged_iter(api_url, headers, {"search": item_name}):
+            if item['name'] == item_name:
                 print("Found Catalog Item " + item_name)
-                cat_id = json_data['content'][n]
-                return cat_id
-                break
-            elif n < end_n:
-                n = n + 1
-            elif n >= end_n:
-                print("No match found for Catalog Item : " + item_name)
-                return "No match found for Catalog Item : " + item_name
-                break
+                return item
+    except requests.exceptions.HTTPError as exc:
+        print(exc.response.status_code)
+        return json.loads(exc.response.content.decode('utf-8'))
+    print("No match found for Catalog Item : " + item_name)
+    return "No match found for Catalog Item : " + item_name
+
+_SCHEMA_TYPES = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "object": (dict,),
+    "array": (list,)
+}
+
+def _compile_schema(schema):
+    """
+    Turn a catalog item input schema into a validate(value, path) function returning a list of errors.
+    Every regex and sub schema is compiled once, so validating inputs does not touch the schema again.
+    """
+    checks = []
+    check_type = None
+    schema_type = schema.get('type')
+    if schema_type in _SCHEMA_TYPES:
+        python_types = _SCHEMA_TYPES[schema_type]
+        def check_type(value, path):
+            if not isinstance(value, python_types) or (isinstance(value, bool) and schema_type != "boolean"):
+                return [path + ' must be of type ' + schema_type]
+            return []
+    allowed = schema.get('enum')
+    if allowed == None and schema.get('oneOf') and all('const' in x for x in schema['oneOf']):
+        allowed = [x['const'] for x in schema['oneOf']]
+    if allowed != None:
+        checks.append(lambda value, path: [] if value in allowed else [path + ' must be one of ' + json.dumps(allowed)])
+    for keyword, test, message in (("minimum", lambda v, b: v >= b, ' must be at least '),
+                                   ("maximum", lambda v, b: v <= b, ' must be at most '),
+                                   ("minLength", lambda v, b: len(v) >= b, ' must be at least this long: '),
+                                   ("maxLength", lambda v, b: len(v) <= b, ' must be at most this long: '),
+                                   ("minItems", lambda v, b: len(v) >= b, ' must have at least this many items: '),
+                                   ("maxItems", lambda v, b: len(v) <= b, ' must have at most this many items: ')):
+        if keyword in schema:
+            def check_bound(value, path, bound=schema[keyword], test=test, message=message):
+                try:
+                    return [] if test(value, bound) else [path + message + str(bound)]
+                except TypeError:
+                    return []
+            checks.append(check_bound)
+    if 'pattern' in schema:
+        pattern = re.compile(schema['pattern'])
+        checks.append(lambda value, path: [] if not isinstance(value, str) or pattern.search(value) else [path + ' must match ' + schema['pattern']])
+    properties = dict((k, _compile_schema(v)) for k, v in schema.get('properties', {}).items())
+    required = [k for k in schema.get('required', []) if 'default' not in schema.get('properties', {}).get(k, {})]
+    if properties or required:
+        def check_object(value, path):
+            if not isinstance(value, dict):
+                return []
+            errors = [path + '.' + k + ' is required' for k in required if k not in value]
+            for k, v in value.items():
+                if k in properties:
+                    errors.extend(properties[k](v, path + '.' + k))
+            return errors
+        checks.append(check_object)
+    if isinstance(schema.get('items'), dict):
+        item_check = _compile_schema(schema['items'])
+        def check_items(value, path):
+            errors = []
+            if isinstance(value, list):
+                for n, item in enumerate(value):
+                    errors.extend(item_check(item, path + '[' + str(n) + ']'))
+            return errors
+        checks.append(check_items)
+    def validate(value, path="inputs"):
+        if check_type != None:
+            errors = check_type(value, path)
+            if errors:
+                return errors
+        errors = []
+        for check in checks:
+            errors.extend(check(value, path))
+        return errors
+    return validate
+
+def _catalog_item_schema(url,username,password,item_id,version=None,refresh=False):
+    """
+    Cached (schema, validator) of a catalog item version (the current version when version is not set)
+    """
+    def build():
+        api_url_base = set_bas_url(url)
+        access_key = get_token(url,username, password)
+        headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+        if version:
+            api_url = '{0}catalog/api/items/{1}/versions/{2}'.format(api_url_base,item_id,version)
+        else:
+            api_url = '{0}catalog/api/items/{1}'.format(api_url_base,item_id)
+        response = requests.get(api_url, headers=headers, verify=False)
+        response.raise_for_status()
+        schema = json.loads(response.content.decode('utf-8')).get('schema') or {}
+        return (schema, _compile_schema(schema))
+    return _cached_index(url,username,'catalog-schema/{0}/{1}'.format(item_id,version or ''),build,refresh)
+
+def get_catalog_item_schema(url,username,password,item_name,version=None,refresh=False):
+    """
+    Retrieve the input schema of a catalog item version and return it via json. Schemas are cached.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin User
+
+    password = vRA Admin Password
+
+    item_name = Catalog Item Name
+
+    version = Version of the catalog item (current version if not set)
+
+    refresh = Read the schema from vRA again instead of using the cached one (default is False)
+    """
+    item_json = get_catalog_item_by_name(url,username,password,item_name)
+    if not isinstance(item_json, dict) or 'id' not in item_json:
+        return item_json
+    return _catalog_item_schema(url,username,password,item_json['id'],version,refresh)[0]
+
+def validate_catalog_inputs(url,username,password,item_name,input_json,version=None):
+    """
+    Validate catalog request inputs against the cached input schema of the catalog item without requesting it
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin User
+
+    password = vRA Admin Password
+
+    item_name = Catalog Item Name
+
+    input_json = Inputs to validate (i.e. {"machine_name": "machine1","image": "ubuntu"})
+
+    version = Version of the catalog item (current version if not set)
+    """
+    item_json = get_catalog_item_by_name(url,username,password,item_name)
+    if not isinstance(item_json, dict) or 'id' not in item_json:
+        return item_json
+    errors = _catalog_item_schema(url,username,password,item_json['id'],version)[1](input_json or {})
+    if errors:
+        print('Invalid inputs for Catalog Item ' + item_name + ': ' + "; ".join(errors))
+    return {"valid": not errors, "errors": errors}
+
+def _deployment_transitions(api_url_base,headers,dep_id,timeout=3600,interval=2,max_interval=30,resources=True,stop=None):
+    """
+    Poll the requests (and resources) of a deployment and yield every status change until the latest request is
+    done or timeout seconds have passed. The last item yielded is always the "deployment" transition holding the
+    final status. The poll interval grows by half on every poll without a change (up to max_interval) and drops
+    back to interval when something changed. Setting the stop event ends the polling with status CANCELLED.
+    """
+    start = time.time()
+    delay = interval
+    seen = {}
+    latest = None
+    while True:
+        changes = []
+        try:
+            dep_requests = _paged_get_all('{0}deployment/api/deployments/{1}/requests'.format(api_url_base,dep_id), headers)
+            items = [("request", x, x.get('status')) for x in dep_requests]
+            if resources:
+                dep_resources = _paged_get_all('{0}deployment/api/deployments/{1}/resources'.format(api_url_base,dep_id), headers)
+                items.extend(("resource", x, x.get('state')) for x in dep_resources)
+            if dep_requests:
+                latest = max(dep_requests, key=lambda x: x.get('createdAt') or '')
+        except requests.exceptions.RequestException as exc:
+            log.debug('Polling deployment %s failed: %s', dep_id, exc)
+            items = []
+        for kind, item, status in items:
+            key = (kind, item.get('id'))
+            if key not in seen or seen[key] != status:
+                changes.append({"deploymentId": dep_id, "kind": kind, "id": item.get('id'), "name": item.get('name'),
+                                "old": seen.get(key), "new": status, "seconds": round(time.time() - start, 1)})
+                seen[key] = status
+        for change in changes:
+            yield change
+        status = latest.get('status') if latest else None
+        if status not in REQUEST_DONE_STATES and time.time() - start + delay > timeout:
+            status = "TIMEOUT"
+        if status in REQUEST_DONE_STATES or status == "TIMEOUT":
+            yield {"deploymentId": dep_id, "kind": "deployment", "id": dep_id, "name": latest.get('name') if latest else None,
+                   "old": None, "new": status, "seconds": round(time.time() - start, 1),
+                   "details": latest.get('details') if latest else None}
+            return
+        if changes:
+            delay = interval
+        else:
+            delay = min(delay * 1.5, max_interval)
+        if stop == None:
+            time.sleep(delay)
+        elif stop.wait(delay):
+            yield {"deploymentId": dep_id, "kind": "deployment", "id": dep_id, "name": latest.get('name') if latest else None,
+                   "old": None, "new": "CANCELLED", "seconds": round(time.time() - start, 1), "details": None}
+            return
+
+def _failed_resources(api_url_base,headers,dep_id):
+    api_url = '{0}deployment/api/deployments/{1}/resources'.format(api_url_base,dep_id)
+    return [{"name": x.get('name'), "type": x.get('type'), "state": x.get('state')} for x in _paged_get_all(api_url, headers) if x.get('state') != "OK"]
+
+def _wait_for_deployment(api_url_base,headers,dep_id,timeout=3600,interval=2,max_interval=30,stop=None):
+    """
+    Wait until the latest request of a deployment is done and return its final status, duration and failures
+    """
+    for change in _deployment_transitions(api_url_base,headers,dep_id,timeout,interval,max_interval,resources=False,stop=stop):
+        final = change
+    result = {"deploymentId": dep_id, "status": final['new'], "seconds": final['seconds']}
+    if final['new'] not in ("SUCCESSFUL", "CANCELLED"):
+        result["details"] = final['details']
+        try:
+            result["failedResources"] = _failed_resources(api_url_base,headers,dep_id)
+        except requests.exceptions.RequestException as exc:
+            result["failedResources"] = str(exc)
+    return result
+
+def _fire_event(tag,data):
+    salt_funcs = globals().get('__salt__')
+    if salt_funcs != None and 'event.send' in salt_funcs:
+        salt_funcs['event.send'](tag, data)
     else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+        log.debug('Salt event bus not available, not firing %s', tag)
+
+def _watch(api_url_base,headers,dep_id,timeout,interval,max_interval,fire_event,tag_prefix):
+    for change in _deployment_transitions(api_url_base,headers,dep_id,timeout,interval,max_interval):
+        if fire_event:
+            _fire_event('{0}/{1}/{2}/{3}'.format(tag_prefix,dep_id,change['kind'],str(change['new']).lower()), change)
+        yield change
+
+def watch_deployment(url,username,password,dep_name,timeout=3600,interval=2,max_interval=30,fire_event=False,tag_prefix="vra/deployment"):
+    """
+    Follow a deployment and yield every state change of its requests and resources until the latest request is done.
+    Each change is a dict with deploymentId, kind (request / resource / deployment), id, name, old, new and seconds,
+    the last one is always kind "deployment" with the final status (SUCCESSFUL / FAILED / ABORTED / TIMEOUT).
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin User
+
+    password = vRA Admin Password
+
+    dep_name = Name of the Deployment
+
+    timeout = Seconds to follow the deployment before giving up (default is 3600)
+
+    interval = Seconds between polls right after a change (default is 2)
+
+    max_interval = Longest wait between polls while nothing changes (default is 30)
+
+    fire_event = Fire every change on the Salt event bus (default is False)
+
+    tag_prefix = Prefix of the event tags, events are tagged <tag_prefix>/<deployment id>/<kind>/<new state>
+    (default is vra/deployment, i.e. vra/deployment/<id>/deployment/successful)
+    """
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    dep_json = get_deployment_by_name(url,username,password,dep_name)
+    if not isinstance(dep_json, dict) or 'id' not in dep_json:
+        return dep_json
+    return _watch(api_url_base,headers,dep_json['id'],timeout,interval,max_interval,fire_event,tag_prefix)
 
-def request_catalog_item(url,username,password,proj_name,item_name,deployment_name,input_json,reason=None,version=None):
+def request_catalog_item(url,username,password,proj_name,item_name,deployment_name,input_json,reason=None,version=None,count=1,wait=False,timeout=3600,validate=True,max_workers=8):
     """
-    Request a catalog item for deployment
+    Request a catalog item for deployment and return the created deployments (deploymentId / deploymentName) via json
 
     Arguments:
 
@@ -2966,6 +4635,19 @@ def request_catalog_item(url,username,password,proj_name,item_name,deployment_na
     input_json = Inpus for the catalog request in json format (i.e. {"machine_name": "machine1","image": "ubuntu"})
 
     reason = Reason for the deployment (This is not required)
+
+    version = Version of the catalog item to request (latest version if not set)
+
+    count = Number of deployments to request with this single request (default is 1)
+
+    wait = Wait until every requested deployment is finished and add its final status, duration in seconds
+    and failed resources to the result (default is False)
+
+    timeout = Seconds to wait for the deployments when wait is set (default is 3600)
+
+    validate = Check input_json against the cached input schema of the catalog item before requesting it (default is True)
+
+    max_workers = Maximum number of deployments polled at the same time when wait is set (default is 8)
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
@@ -2974,13 +4656,18 @@ def request_catalog_item(url,username,password,proj_name,item_name,deployment_na
     proj_id = proj_json['id']
     item_json = get_catalog_item_by_name(url,username,password,item_name)
     item_id = item_json['id']
+    if validate:
+        errors = _catalog_item_schema(url,username,password,item_id,version)[1](input_json or {})
+        if errors:
+            print('Invalid inputs for Catalog Item ' + item_name + ': ' + "; ".join(errors))
+            return {"valid": False, "errors": errors}
     if version == None:
         version = ""
     if reason == None:
         reason = ""
     api_url = '{0}catalog/api/items/{1}/request'.format(api_url_base,item_id)
     data =  {
-              "bulkRequestCount": 1,
+              "bulkRequestCount": count,
               "deploymentName": deployment_name,
               "inputs": input_json,
               "projectId": proj_id,
@@ -2988,15 +4675,250 @@ def request_catalog_item(url,username,password,proj_name,item_name,deployment_na
               "version": version
             }
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
-    if response.status_code == 200:
+    if response.status_code in (200, 201):
         print('Successfully Deployed Catalog Item: ' + item_name + ' with deployment name ' + deployment_name)
-        return 'Successfully Deployed Catalog Item: ' + item_name + ' with deployment name ' + deployment_name
+        deployments = json.loads(response.content.decode('utf-8'))
+        if wait:
+            deadline = time.time() + timeout
+            finished = _run_concurrently(lambda x: _wait_for_deployment(api_url_base,headers,x['deploymentId'],max(0, deadline - time.time())), deployments, max_workers)
+            for deployment, result in zip(deployments, finished):
+                deployment.update(result)
+            succeeded = len([x for x in deployments if x['status'] == "SUCCESSFUL"])
+            print(str(succeeded) + ' of ' + str(len(deployments)) + ' deployments of ' + item_name + ' finished successfully')
+        return deployments
     else:
         print(response.status_code)
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
 
-def get_deployment_by_name(url,username,password,dep_name):
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    def rank(pct):
+        return round(values[min(len(values) - 1, int(len(values) * pct / 100.0))], 3)
+    return {"p50": rank(50), "p90": rank(90), "p99": rank(99), "max": round(values[-1], 3)}
+
+def _gate_acquire(gate):
+    with gate["cond"]:
+        while gate["in_flight"] >= int(gate["limit"]):
+            gate["cond"].wait()
+        gate["in_flight"] = gate["in_flight"] + 1
+        gate["peak"] = max(gate["peak"], gate["in_flight"])
+
+def _gate_release(gate,latency,throttled):
+    """
+    Adjust the request limit like TCP congestion control: grow by one per success until the first back off,
+    then by one per full window. Throttling (429 / 5xx / errors) halves the limit, latency above twice the
+    fastest response seen shrinks it by a quarter.
+    """
+    with gate["cond"]:
+        gate["in_flight"] = gate["in_flight"] - 1
+        if not throttled and (gate["baseline"] == None or latency < gate["baseline"]):
+            gate["baseline"] = latency
+        if throttled:
+            gate["limit"] = max(gate["min"], gate["limit"] / 2.0)
+            gate["threshold"] = gate["limit"]
+        elif latency > 2 * gate["baseline"]:
+            gate["limit"] = max(gate["min"], gate["limit"] * 0.75)
+            gate["threshold"] = gate["limit"]
+        elif gate["limit"] < gate["threshold"]:
+            gate["limit"] = min(gate["max"], gate["limit"] + 1)
+        else:
+            gate["limit"] = min(gate["max"], gate["limit"] + 1.0 / gate["limit"])
+        gate["cond"].notify_all()
+
+def _launch_spec(spec):
+    """
+    Turn a deployment given as [item_name, proj_name, deployment_name, inputs] or as a dict into a dict,
+    raising ValueError when it does not name a catalog item, project and deployment
+    """
+    if isinstance(spec, dict):
+        spec = dict(spec)
+    elif isinstance(spec, (list, tuple)) and len(spec) == 4:
+        item_name, proj_name, deployment_name, inputs = spec
+        spec = {"item_name": item_name, "proj_name": proj_name, "deployment_name": deployment_name, "inputs": inputs}
+    else:
+        raise ValueError("Deployment must be [item_name, proj_name, deployment_name, inputs] or a dict: " + repr(spec))
+    missing = [x for x in ("item_name", "proj_name", "deployment_name") if spec.get(x) == None]
+    if missing:
+        raise ValueError("Deployment " + repr(spec.get('deployment_name')) + " is missing " + ", ".join(missing))
+    return spec
+
+def _submit_deployment(api_url_base,headers,gate,spec,item_id,proj_id,retries,stop=None):
+    result = {"deploymentName": spec['deployment_name'], "item_name": spec['item_name'], "proj_name": spec['proj_name']}
+    api_url = '{0}catalog/api/items/{1}/request'.format(api_url_base,item_id)
+    data =  {
+              "bulkRequestCount": 1,
+              "deploymentName": spec['deployment_name'],
+              "inputs": spec.get('inputs', {}),
+              "projectId": proj_id,
+              "reason": spec.get('reason') or "",
+              "version": spec.get('version') or ""
+            }
+    attempt = 0
+    while True:
+        attempt = attempt + 1
+        _gate_acquire(gate)
+        start = time.time()
+        try:
+            response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
+            status_code = response.status_code
+        except requests.exceptions.RequestException as exc:
+            response = None
+            status_code = str(exc)
+        latency = time.time() - start
+        throttled = response == None or status_code == 429 or status_code >= 500
+        _gate_release(gate,latency,throttled)
+        if not throttled or attempt > retries or (stop != None and stop.is_set()):
+            break
+        retry_after = response.headers.get('Retry-After') if response != None else None
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = min(2 ** attempt, 30)
+        if stop == None:
+            time.sleep(delay)
+        elif stop.wait(delay):
+            break
+    result.update(attempts=attempt, submitSeconds=round(latency, 3))
+    if response != None and status_code in (200, 201):
+        result.update(status="requested", deploymentId=json.loads(response.content.decode('utf-8'))[0]['deploymentId'])
+    elif response != None:
+        result.update(status="failed", error=json.loads(response.content.decode('utf-8') or '{}'))
+    else:
+        result.update(status="failed", error=status_code)
+    return result
+
+def _new_gate(min_workers,max_workers):
+    return {"limit": float(max(min_workers, min(2, max_workers))), "min": min_workers, "max": max_workers,
+            "threshold": float(max_workers), "baseline": None, "in_flight": 0, "peak": 0, "cond": threading.Condition()}
+
+def _iter_launch(url,username,password,deployments,gate,wait,timeout,retries,validate):
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    results = queue.Queue()
+    specs = []
+    for deployment in deployments:
+        try:
+            specs.append(_launch_spec(deployment))
+        except ValueError as exc:
+            name = deployment.get('deployment_name') if isinstance(deployment, dict) else None
+            results.put({"deploymentName": name, "status": "failed", "error": str(exc)})
+    invalid = results.qsize()
+    item_ids = {}
+    if specs:
+        item_ids = dict((x['name'], x['id']) for x in _paged_get_all('{0}catalog/api/items'.format(api_url_base), headers))
+    proj_ids = {}
+    if specs:
+        proj_ids = dict((x['name'], x['id']) for x in _iaas_get_all('{0}iaas/api/projects'.format(api_url_base), headers))
+    def finish(result):
+        try:
+            result.update(_wait_for_deployment(api_url_base,headers,result['deploymentId'],timeout,stop=stop))
+        except Exception as exc:
+            result.update(error=str(exc))
+        results.put(result)
+    def launch(spec):
+        result = {"deploymentName": spec['deployment_name'], "item_name": spec['item_name'], "proj_name": spec['proj_name']}
+        try:
+            if stop.is_set():
+                result.update(status="cancelled")
+            elif spec['item_name'] not in item_ids:
+                result.update(status="failed", error="No match found for Catalog Item : " + spec['item_name'])
+            elif spec['proj_name'] not in proj_ids:
+                result.update(status="failed", error="No Match Found For Project: " + spec['proj_name'])
+            else:
+                errors = []
+                if validate:
+                    errors = _catalog_item_schema(url,username,password,item_ids[spec['item_name']],spec.get('version'))[1](spec.get('inputs') or {})
+                if errors:
+                    result.update(status="invalid", errors=errors)
+                else:
+                    result = _submit_deployment(api_url_base,headers,gate,spec,item_ids[spec['item_name']],proj_ids[spec['proj_name']],retries,stop)
+            if wait and result['status'] == "requested":
+                futures.append(waiters.submit(finish, result))
+                return
+        except Exception as exc:
+            result.update(status="failed", error=str(exc))
+        results.put(result)
+    submitters = ThreadPoolExecutor(max_workers=max(1, gate["max"]))
+    waiters = ThreadPoolExecutor(max_workers=max(1, min(len(specs), 64)))
+    futures = []
+    stop = threading.Event()
+    try:
+        for spec in specs:
+            futures.append(submitters.submit(launch, spec))
+        for n in range(invalid + len(specs)):
+            yield results.get()
+    finally:
+        stop.set()
+        for future in futures:
+            future.cancel()
+        submitters.shutdown(wait=False)
+        waiters.shutdown(wait=False)
+
+def iter_launch_deployments(url,username,password,deployments,max_workers=16,min_workers=1,wait=True,timeout=3600,retries=5,validate=True):
+    """
+    Request many catalog items like launch_deployments, but yield the result of each deployment as soon as it is
+    known instead of returning them all at the end. Takes the same arguments as launch_deployments.
+    """
+    return _iter_launch(url,username,password,deployments,_new_gate(min_workers,max_workers),wait,timeout,retries,validate)
+
+def launch_deployments(url,username,password,deployments,max_workers=16,min_workers=1,wait=True,timeout=3600,retries=5,validate=True):
+    """
+    Request many catalog items with adaptive concurrency, i.e. for load tests and environment refreshes.
+    Catalog items and projects are resolved from one listing each. The number of requests in flight starts
+    small, grows while vRA answers quickly and shrinks on 429 / 5xx answers or growing latency.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin user
+
+    password = vRA Admin password
+
+    deployments = List of deployments as [item_name, proj_name, deployment_name, inputs] or as dicts with
+    item_name, proj_name, deployment_name, inputs and optional version / reason
+    (i.e. [{"item_name": "ubuntu", "proj_name": "Dev", "deployment_name": "load-001", "inputs": {"size": "small"}}])
+
+    max_workers = Maximum number of catalog requests in flight (default is 16)
+
+    min_workers = Minimum number of catalog requests in flight when vRA is throttling (default is 1)
+
+    wait = Wait for every deployment to finish and report its final status and duration (default is True)
+
+    timeout = Seconds to wait for each deployment when wait is set (default is 3600)
+
+    retries = Times a throttled (429 / 5xx) catalog request is retried (default is 5)
+
+    validate = Check the inputs of every deployment against the cached input schema of its catalog item version
+    before requesting it, invalid ones are reported with status invalid (default is True)
+    """
+    start = time.time()
+    gate = _new_gate(min_workers,max_workers)
+    deployments_out = []
+    for result in _iter_launch(url,username,password,deployments,gate,wait,timeout,retries,validate):
+        log.info('Deployment %s: %s', result['deploymentName'], result['status'])
+        deployments_out.append(result)
+    seconds = time.time() - start
+    requested = [x for x in deployments_out if 'deploymentId' in x]
+    summary = {
+                "total": len(deployments_out),
+                "requested": len(requested),
+                "seconds": round(seconds, 1),
+                "requestsPerMinute": round(len(requested) * 60 / seconds, 2) if seconds else None,
+                "peakConcurrency": gate["peak"],
+                "submitLatency": _percentiles([x['submitSeconds'] for x in deployments_out if 'submitSeconds' in x])
+              }
+    if wait:
+        summary["succeeded"] = len([x for x in deployments_out if x['status'] == "SUCCESSFUL"])
+        summary["deployLatency"] = _percentiles([x['seconds'] for x in requested if 'seconds' in x])
+    print('Requested ' + str(len(requested)) + ' of ' + str(len(deployments_out)) + ' deployments in ' + str(summary["seconds"]) + ' seconds')
+    return {"deployments": deployments_out, "summary": summary}
+
+def get_deployment_by_name(url,username,password,dep_name,expand_resources=False):
     """
     Retrieve an existing deployment by name and return information via json
 
@@ -3009,36 +4931,167 @@ def get_deployment_by_name(url,username,password,dep_name):
     password = vRA Admin Password
 
     dep_name = Name of the Deployment
+
+    expand_resources = Include the resources of the deployment (default is False)
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}deployment/api/deployments'.format(api_url_base)
-    response = requests.get(api_url, headers=headers, verify=False)
-    if response.status_code == 200:
-        json_data = json.loads(response.content.decode('utf-8'))
-        n = 0
-        end_n = json_data['numberOfElements']
-        end_n = end_n - 1
-        while True:
-            dp_name = json_data['content'][n]['name']
-            if dp_name == dep_name:
-                print("Found Catalog Item " + dep_name)
-                dp_id = json_data['content'][n]
-                return dp_id
-                break
-            elif n < end_n:
-                n = n + 1
-            elif n >= end_n:
-                print("No match found for Deployment : " + dep_name)
-                return "No match found for zdeployment : " + dep_name
-                break
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    params = {"name": dep_name, "search": dep_name}
+    if expand_resources:
+        params['expand'] = "resources"
+    try:
+        for deployment in _paged_iter(api_url, headers, params, 20):
+            if deployment['name'] == dep_name:
+                print("Found Deployment " + dep_name)
+                return deployment
+    except requests.exceptions.HTTPError as exc:
+        print(exc.response.status_code)
+        return json.loads(exc.response.content.decode('utf-8'))
+    print("No match found for Deployment : " + dep_name)
+    return "No match found for Deployment : " + dep_name
+
+def iter_deployments(url,username,password,proj_name=None,status=None,owner=None,search=None,expand_resources=False,page_size=100):
+    """
+    Yield every deployment matching the filters one by one, the filters are applied by vRA and the next page is
+    only requested once the current one has been consumed
 
-def delete_deployment(url,username,password,dep_name):
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin User
+
+    password = vRA Admin Password
+
+    proj_name = Only deployments of this project, LookupError is raised when the project does not exist
+
+    status = Only deployments with this status (i.e. CREATE_SUCCESSFUL, CREATE_FAILED, UPDATE_INPROGRESS)
+
+    owner = Only deployments owned by this user (i.e. cicd@corp.local)
+
+    search = Only deployments matching this text search (name, description ...)
+
+    expand_resources = Include the resources of every deployment (default is False)
+
+    page_size = Deployments requested per page (default is 100)
+    """
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    params = {}
+    if proj_name != None:
+        proj_json = get_proj_by_name(url,username,password,proj_name)
+        if not isinstance(proj_json, dict) or 'id' not in proj_json:
+            raise LookupError("No Match Found For Project: " + proj_name)
+        params['projects'] = proj_json['id']
+    if status != None:
+        params['status'] = status
+    if owner != None:
+        params['ownedBy'] = owner
+    if search != None:
+        params['search'] = search
+    if expand_resources:
+        params['expand'] = "resources"
+    for deployment in _paged_iter('{0}deployment/api/deployments'.format(api_url_base), headers, params, page_size):
+        yield deployment
+
+def get_deployment_changes(url,username,password,cursor=None,page_size=100,max_pages=50):
+    """
+    Return the deployments changed since cursor, newest first, together with the cursor for the next call.
+    Deployments are read sorted by lastUpdatedAt and paging stops at the first deployment the cursor already covers,
+    so polling a large tenant only downloads what changed. The cursor holds the newest lastUpdatedAt and the ids
+    updated at exactly that time (at most page_size of them). The first call (no cursor) always reads every deployment.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin User
+
+    password = vRA Admin Password
+
+    cursor = Cursor returned by the previous call (if not set every deployment is returned)
+
+    page_size = Deployments requested per page (default is 100)
+
+    max_pages = Most pages read in one call with a cursor, when reached truncated is set and older changes are skipped (default is 50)
+    """
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    api_url = '{0}deployment/api/deployments'.format(api_url_base)
+    since = _epoch(cursor['since']) if cursor else None
+    seen_ids = set(cursor['ids']) if cursor else set()
+    changed = []
+    truncated = False
+    for deployment in _paged_iter(api_url, headers, {"sort": "lastUpdatedAt,DESC"}, page_size):
+        updated = _epoch(deployment.get('lastUpdatedAt'))
+        if since != None and updated == None:
+            continue
+        if since != None and (updated < since or (updated == since and deployment['id'] in seen_ids)):
+            break
+        if cursor and len(changed) >= page_size * max_pages:
+            truncated = True
+            log.warning('More than %s deployments changed since the last poll, older changes are skipped', len(changed))
+            break
+        changed.append(deployment)
+    new_cursor = dict(cursor) if cursor else {"since": None, "ids": []}
+    if changed and changed[0].get('lastUpdatedAt'):
+        newest = _epoch(changed[0]['lastUpdatedAt'])
+        ids = [x['id'] for x in changed if _epoch(x.get('lastUpdatedAt')) == newest]
+        if newest == since:
+            ids = ids + [x for x in new_cursor['ids'] if x not in ids]
+        new_cursor = {"since": changed[0]['lastUpdatedAt'], "ids": ids[:page_size]}
+    return {"deployments": changed, "cursor": new_cursor, "truncated": truncated}
+
+def _wait_for_delete(api_url_base,headers,dep_id,timeout=3600,interval=2,max_interval=30):
+    """
+    Poll a deployment until vRA no longer finds it (deleted) or it reports a failed delete, backing off like
+    _deployment_transitions while its status does not change
+    """
+    start = time.time()
+    delay = interval
+    status = None
+    api_url = '{0}deployment/api/deployments/{1}'.format(api_url_base,dep_id)
+    while True:
+        try:
+            response = requests.get(api_url, headers=headers, verify=False)
+            if response.status_code == 404:
+                return {"status": "deleted", "seconds": round(time.time() - start, 1)}
+            response.raise_for_status()
+            current = json.loads(response.content.decode('utf-8')).get('status')
+        except requests.exceptions.RequestException as exc:
+            log.debug('Polling deployment %s failed: %s', dep_id, exc)
+            current = status
+        if current == "DELETE_FAILED":
+            return {"status": "failed", "error": current, "seconds": round(time.time() - start, 1)}
+        if current != status:
+            status = current
+            delay = interval
+        else:
+            delay = min(delay * 1.5, max_interval)
+        if time.time() - start + delay > timeout:
+            return {"status": "timeout", "error": status, "seconds": round(time.time() - start, 1)}
+        time.sleep(delay)
+
+def _delete_one_deployment(api_url_base,headers,deployment,wait=False,timeout=3600):
+    result = {"id": deployment['id'], "name": deployment.get('name')}
+    api_url = '{0}deployment/api/deployments/{1}'.format(api_url_base,deployment['id'])
+    try:
+        response = requests.delete(api_url, headers=headers, verify=False)
+        if response.status_code not in (200, 202, 204):
+            result.update(status="failed", error=json.loads(response.content.decode('utf-8') or '{}'))
+            return result
+        result.update(status="requested")
+        if wait:
+            result.update(_wait_for_delete(api_url_base,headers,deployment['id'],timeout))
+    except Exception as exc:
+        result.update(status="failed", error=str(exc))
+    return result
+
+def delete_deployment(url,username,password,dep_name,wait=False,timeout=3600):
     """
     Deletes an existing deployment
 
@@ -3051,20 +5104,258 @@ def delete_deployment(url,username,password,dep_name):
     password = vRA Admin Password
 
     dep_name = Name of the Deployment
+
+    wait = Wait until vRA has finished tearing the deployment down (default is False)
+
+    timeout = Seconds to wait for the teardown when wait is set (default is 3600)
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
     dep_json = get_deployment_by_name(url,username,password,dep_name)
-    dep_id = dep_json['id']
+    if not isinstance(dep_json, dict) or 'id' not in dep_json:
+        return dep_json
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
-    api_url = '{0}deployment/api/deployments/{1}'.format(api_url_base,dep_id)
-    response = requests.delete(api_url, headers=headers, verify=False)
-    if response.status_code == 200:
+    result = _delete_one_deployment(api_url_base,headers,dep_json,wait,timeout)
+    if result['status'] == "deleted":
         print('Successfully Deleted Deployment: ' + dep_name)
         return 'Successfully Deleted Deployment: ' + dep_name
+    elif result['status'] == "requested":
+        print('Successfully Requested Deletion of Deployment: ' + dep_name)
+        return 'Successfully Requested Deletion of Deployment: ' + dep_name
     else:
-        print(response.status_code)
-        return response.status_code
+        print('Failed to Delete Deployment: ' + dep_name)
+        return result
+
+def delete_deployments(url,username,password,name_pattern=None,proj_name=None,owner=None,tags=None,older_than=None,max_workers=8,wait=True,timeout=3600,dry_run=False):
+    """
+    Deletes every deployment matching the filters, i.e. for nightly cleanup of CI environments, and returns a
+    report per deployment. Project, owner, tags and the literal part of name_pattern are searched on the server,
+    at least one filter is required.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin User
+
+    password = vRA Admin Password
+
+    name_pattern = Shell-style pattern the deployment name must match (i.e. ci-*)
+
+    proj_name = Only delete deployments of this project
+
+    owner = Only delete deployments owned by this user (i.e. cicd@corp.local)
+
+    tags = Only delete deployments with one of these tags (i.e. ["env:ci"] or {"env": "ci"})
+
+    older_than = Only delete deployments created more than this many hours ago
+
+    max_workers = Maximum number of delete requests sent at the same time (default is 8)
+
+    wait = Wait until every deployment is torn down (default is True)
+
+    timeout = Seconds to wait for each teardown when wait is set (default is 3600)
+
+    dry_run = Only report the deployments that would be deleted (default is False)
+    """
+    if name_pattern == None and proj_name == None and owner == None and tags == None and older_than == None:
+        print('Provide at least one filter for the deployments to delete')
+        return 'Provide at least one filter for the deployments to delete'
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    params = {}
+    if name_pattern != None:
+        params['search'] = max(re.split(r'[*?\[\]]', name_pattern), key=len)
+    if proj_name != None:
+        proj_json = get_proj_by_name(url,username,password,proj_name)
+        if not isinstance(proj_json, dict) or 'id' not in proj_json:
+            return "No Match Found For Project: " + proj_name
+        params['projects'] = proj_json['id']
+    if owner != None:
+        params['ownedBy'] = owner
+    if tags != None:
+        params['tags'] = ",".join(x['key'] + ':' + x['value'] for x in _normalize_tags(tags))
+    deployments = []
+    for deployment in _paged_iter('{0}deployment/api/deployments'.format(api_url_base), headers, params):
+        if name_pattern != None and not fnmatch.fnmatchcase(deployment.get('name', ''), name_pattern):
+            continue
+        if older_than != None and time.time() - (_epoch(deployment.get('createdAt')) or time.time()) < float(older_than) * 3600:
+            continue
+        deployments.append(deployment)
+    if dry_run:
+        print('Would delete ' + str(len(deployments)) + ' deployments')
+        return [{"id": x['id'], "name": x.get('name'), "status": "selected"} for x in deployments]
+    start = time.time()
+    results = _run_concurrently(lambda x: _delete_one_deployment(api_url_base,headers,x), deployments, max_workers)
+    if wait:
+        requested = [x for x in results if x['status'] == "requested"]
+        finished = _run_concurrently(lambda x: _wait_for_delete(api_url_base,headers,x['id'],timeout), requested, min(len(requested), 64))
+        for result, outcome in zip(requested, finished):
+            result.update(outcome)
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    summary["seconds"] = round(time.time() - start, 1)
+    print('Deleted deployments: ' + ", ".join(k + ' ' + str(v) for k, v in sorted(summary.items()) if k != "seconds"))
+    return {"deployments": results, "summary": summary}
+
+def _policy_criteria(operator,catitem_id):
+    return {
+             "matchExpression": {
+               "key": "catalogItemId",
+               "operator": operator,
+               "value": catitem_id
+             }
+           }
+
+def _lease_policy_data(polname,proj_id,enftype,operator,catitem_id,leasegrace=15,leaseterm=30,leasemax=90):
+    return {
+             "name": polname,
+             "projectId": proj_id,
+             "definition": {
+               "leaseGrace": leasegrace,
+               "leaseTermMax": leaseterm,
+               "leaseTotalTermMax": leasemax
+             },
+             "enforcementType": enftype,
+             "typeId": "com.vmware.policy.deployment.lease",
+             "criteria": _policy_criteria(operator,catitem_id)
+           }
+
+def _approval_policy_data(polname,proj_id,enftype,operator,catitem_id,level=1,expiry=5):
+    return {
+             "name": polname,
+             "projectId": proj_id,
+             "definition": {
+               "level": level,
+               "approvalMode": "ANY_OF",
+               "autoApprovalDecision": "APPROVE",
+               "approvers": [
+                 "USER:configuser"
+               ],
+               "autoApprovalExpiry": expiry,
+               "actions": [
+                 "Deployment.Create"
+               ]
+             },
+             "enforcementType": enftype,
+             "typeId": "com.vmware.policy.approval",
+             "criteria": _policy_criteria(operator,catitem_id)
+           }
+
+def _action_policy_data(polname,proj_id,enftype,operator,catitem_id,action):
+    return {
+             "name": polname,
+             "projectId": proj_id,
+             "definition": {
+               "allowedActions": [
+                 {
+                   "authorities": [
+                     "ROLE:administrator"
+                   ],
+                   "actions": [
+                     action
+                   ]
+                 }
+               ]
+             },
+             "enforcementType": enftype,
+             "typeId": "com.vmware.policy.deployment.action",
+             "criteria": _policy_criteria(operator,catitem_id)
+           }
+
+_POLICY_TYPES = {
+    "lease": _lease_policy_data,
+    "approval": _approval_policy_data,
+    "action": _action_policy_data
+}
+
+def _apply_policy(api_url,headers,existing,data):
+    result = {"name": data['name'], "projectId": data['projectId']}
+    current = existing.get((data['name'], data['projectId']))
+    if current != None:
+        changes = _diff_fields(data, current)
+        if not changes:
+            result.update(status="unchanged", id=current['id'])
+            return result
+        data = dict(data, id=current['id'])
+        result["changes"] = changes
+    try:
+        response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
+        json_data = json.loads(response.content.decode('utf-8') or '{}')
+    except Exception as exc:
+        result.update(status="failed", error=str(exc))
+        return result
+    if response.status_code in (200, 201):
+        result.update(status="updated" if current != None else "created", id=json_data.get('id'))
+    else:
+        result.update(status="failed", error=json_data)
+    return result
+
+def apply_policies(url,username,password,policies,max_workers=8):
+    """
+    Creates or updates many Service Broker policies at once. Projects and catalog items are resolved from one
+    listing each, and policies that already match their spec are left alone.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin
+
+    password = vRA Admin Password
+
+    policies = List of policies, each with type (lease / approval / action), polname, projname, enftype, operator,
+    item_name and the options of create_lease_policy / create_approval_policy / create_action_policy
+    (i.e. [{"type": "lease", "polname": "dev-lease", "projname": "Dev", "enftype": "HARD", "operator": "eq", "item_name": "ubuntu", "leaseterm": 14}])
+
+    max_workers = Maximum number of policies applied at the same time (default is 8)
+    """
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url, username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    api_url = '{0}policy/api/policies'.format(api_url_base)
+    proj_ids = dict((x['name'], x['id']) for x in _iaas_get_all('{0}iaas/api/projects'.format(api_url_base), headers))
+    item_ids = dict((x['name'], x['id']) for x in _paged_get_all('{0}catalog/api/items'.format(api_url_base), headers))
+    def indexed(refresh):
+        existing = {}
+        for named in _policy_index(url,username,password,refresh).values():
+            for policy in named:
+                existing[(policy['name'], policy.get('projectId'))] = policy
+        return existing
+    existing = indexed(False)
+    results = []
+    payloads = []
+    for policy in policies:
+        spec = dict(policy)
+        result = {"name": spec.get('polname')}
+        policy_type = spec.pop('type', None)
+        projname = spec.pop('projname', None)
+        item_name = spec.pop('item_name', None)
+        if policy_type not in _POLICY_TYPES:
+            result.update(status="failed", error="Unsupported policy type: " + str(policy_type))
+        elif projname not in proj_ids:
+            result.update(status="failed", error="No Match Found For Project: " + str(projname))
+        elif item_name not in item_ids:
+            result.update(status="failed", error="No match found for Catalog Item : " + str(item_name))
+        else:
+            try:
+                payloads.append(_POLICY_TYPES[policy_type](proj_id=proj_ids[projname],catitem_id=item_ids[item_name],**spec))
+                continue
+            except TypeError as exc:
+                result.update(status="failed", error=str(exc))
+        results.append(result)
+    if any((data['name'], data['projectId']) not in existing for data in payloads):
+        existing = indexed(True)
+    results.extend(_run_concurrently(lambda data: _apply_policy(api_url,headers,existing,data), payloads, max_workers))
+    if any(x['status'] in ("created", "updated") for x in results):
+        _invalidate_index(url,username,'policies')
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    print('Policies: ' + ", ".join(k + ' ' + str(v) for k, v in sorted(counts.items())))
+    return results
 
 def create_lease_policy(url,username,password,polname,projname,enftype,operator,item_name,leasegrace=15,leaseterm=30,leasemax=90):
     """
@@ -3104,27 +5395,11 @@ def create_lease_policy(url,username,password,polname,projname,enftype,operator,
     catitem_json = get_catalog_item_by_name(url,username,password,item_name)
     catitem_id = catitem_json['id']
     api_url = '{0}policy/api/policies/'.format(api_url_base)
-    data = {
-            "name": polname,
-            "projectId": proj_id,
-            "definition":{
-                "leaseGrace": leasegrace,
-                "leaseTermMax": leaseterm,
-                "leaseTotalTermMax": leasemax
-            },
-            "enforcementType": enftype,
-            "typeId":"com.vmware.policy.deployment.lease",
-            "criteria":{
-                "matchExpression":{
-                    "key":"catalogItemId",
-                    "operator": operator,
-                    "value": catitem_id
-                }
-            }
-        }
+    data = _lease_policy_data(polname,proj_id,enftype,operator,catitem_id,leasegrace,leaseterm,leasemax)
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
     if response.status_code == 200:
         json_data = json.loads(response.content.decode('utf-8'))
+        _invalidate_index(url,username,'policies')
         print("Successfully Created Lease Policy")
         return None
     else:
@@ -3163,34 +5438,11 @@ def create_approval_policy(url,username,password,polname,projname,enftype,operat
     catitem_json = get_catalog_item_by_name(url,username,password,item_name)
     catitem_id = catitem_json['id']
     api_url = '{0}policy/api/policies/'.format(api_url_base)
-    data = {
-              "name": polname,
-              "projectId": proj_id,
-              "definition": {
-                "level": level,
-                "approvalMode": "ANY_OF",
-                "autoApprovalDecision": "APPROVE",
-                "approvers": [
-                  "USER:configuser"
-                ],
-                "autoApprovalExpiry": expiry,
-                "actions": [
-                  "Deployment.Create"
-                ]
-              },
-              "enforcementType": enftype,
-              "typeId": "com.vmware.policy.approval",
-              "criteria": {
-                "matchExpression": {
-                  "key": "catalogItemId",
-                  "operator": operator,
-                  "value": catitem_id
-                }
-              }
-            }
+    data = _approval_policy_data(polname,proj_id,enftype,operator,catitem_id,level,expiry)
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
     if response.status_code == 200:
         json_data = json.loads(response.content.decode('utf-8'))
+        _invalidate_index(url,username,'policies')
         print("Successfully Created Approval Policy")
         return None
     else:
@@ -3230,34 +5482,11 @@ def create_action_policy(url,username,password,polname,projname,enftype,operator
     catitem_json = get_catalog_item_by_name(url,username,password,item_name)
     catitem_id = catitem_json['id']
     api_url = '{0}policy/api/policies'.format(api_url_base)
-    data =  {
-                "name": polname,
-                "projectId": proj_id,
-                "definition":{
-                    "allowedActions":[
-                        {
-                            "authorities":[
-                                "ROLE:administrator"
-                            ],
-                            "actions":[
-                                action
-                            ]
-                        }
-                    ]
-                },
-                "enforcementType": enftype,
-                "typeId":"com.vmware.policy.deployment.action",
-                "criteria":{
-                    "matchExpression":{
-                        "key":"catalogItemId",
-                        "operator": operator,
-                        "value": catitem_id
-                    }
-                }
-            }
+    data = _action_policy_data(polname,proj_id,enftype,operator,catitem_id,action)
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
     if response.status_code == 200:
         json_data = json.loads(response.content.decode('utf-8'))
+        _invalidate_index(url,username,'policies')
         print("Successfully Created Action Policy")
         return None
     else:
@@ -3290,15 +5519,7 @@ def create_cs_variable(url,username,password,name,proj_name,type,value,descripti
     access_key = get_token(url,username, password)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}codestream/api/variables'.format(api_url_base)
-    if description == None:
-        description = ""
-    data =  {
-              "description": description,
-              "name": name,
-              "project": proj_name,
-              "type": type,
-              "value": value
-            }
+    data = _cs_variable_data(name,proj_name,type,value,description)
     response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
     if response.status_code == 200:
         print('Successfully Created Code Stream Variable')
@@ -3308,9 +5529,26 @@ def create_cs_variable(url,username,password,name,proj_name,type,value,descripti
         json_data = json.loads(response.content.decode('utf-8'))
         return json_data
 
-def get_variable_by_name(url,username,password,variable_name):
+def _cs_get_all(api_url,headers,params=None,page_size=100):
     """
-    Get Storage Profile by Name and return json information
+    Page through a codestream/api collection using $top / $skip and return every document in listing order
+    """
+    query = dict(params or {})
+    documents = []
+    while True:
+        query['$top'] = page_size
+        query['$skip'] = len(documents)
+        response = requests.get(api_url, headers=headers, params=query, verify=False)
+        response.raise_for_status()
+        json_data = json.loads(response.content.decode('utf-8'))
+        links = json_data.get('links', [])
+        documents.extend(json_data['documents'][x] for x in links)
+        if not links or len(documents) >= json_data.get('totalCount', len(documents)):
+            return documents
+
+def get_variable_by_name(url,username,password,variable_name,proj_name=None):
+    """
+    Get Code Stream Variable id by Name
 
     Arguments:
 
@@ -3320,28 +5558,113 @@ def get_variable_by_name(url,username,password,variable_name):
 
     password = vRA Admin password
 
-    storage_profile_name = Storage Profile Name
+    variable_name = Variable Name
+
+    proj_name = Name of the project of the variable (only needed when several projects use the name)
     """
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}codestream/api/variables'.format(api_url_base)
-    response = requests.get(api_url, headers=headers, verify=False)
-    if response.status_code == 200:
-        json_data = json.loads(response.content.decode('utf-8'))
-        var_links = json_data['links']
-        for x in var_links:
-            var_name = json_data['documents'][x]['name']
-            if var_name == variable_name:
-                print("Found variable: " + variable_name)
-                var_id = json_data['documents'][x]['id']
-                return var_id
-            else:
-                print("Variable " + variable_name + " not found!")
-    else:
-        print(response.status_code)
-        json_data = json.loads(response.content.decode('utf-8'))
-        return json_data
+    try:
+        variables = _cs_get_all(api_url, headers)
+    except requests.exceptions.HTTPError as exc:
+        print(exc.response.status_code)
+        return json.loads(exc.response.content.decode('utf-8'))
+    for variable in variables:
+        if variable['name'] == variable_name and (proj_name == None or variable.get('project') == proj_name):
+            print("Found variable: " + variable_name)
+            return variable['id']
+    print("Variable " + variable_name + " not found!")
+    return "Variable " + variable_name + " not found!"
+
+def _cs_variable_data(name,proj_name,type,value,description=None):
+    return {
+             "description": description or "",
+             "name": name,
+             "project": proj_name,
+             "type": str(type).upper(),
+             "value": value
+           }
+
+def _sync_cs_variable(api_url,headers,action,data,current):
+    result = {"name": data['name'], "project": data['project'], "status": action}
+    try:
+        if action == "created":
+            response = requests.post(api_url, headers=headers, data=json.dumps(data), verify=False)
+        elif action == "updated":
+            response = requests.put(api_url + '/' + current['id'], headers=headers, data=json.dumps(data), verify=False)
+        else:
+            response = requests.delete(api_url + '/' + current['id'], headers=headers, verify=False)
+        if response.status_code not in (200, 201, 204):
+            result.update(status="failed", error=json.loads(response.content.decode('utf-8') or '{}'))
+    except Exception as exc:
+        result.update(status="failed", error=str(exc))
+    return result
+
+def sync_cs_variables(url,username,password,variables,prune=False,update_secrets=False,max_workers=8):
+    """
+    Make the Code Stream variables match a dict, i.e. from pillar. All variables are read once and only the
+    ones that differ are created, updated or (with prune) deleted.
+
+    Arguments:
+
+    url = vRA FQDN
+
+    username = vRA Admin user
+
+    password = vRA Admin password
+
+    variables = Dict of variable name to [project, type, value, description] or to a dict with project, type,
+    value and optional description (i.e. {"git_token": {"project": "Dev", "type": "SECRET", "value": "abc"}})
+
+    prune = Delete the variables of the listed projects that are not in variables (default is False)
+
+    update_secrets = vRA does not return the value of SECRET / RESTRICTED variables, so their value can not be
+    compared. Set to True to always write them, otherwise they are only updated when type or description differ (default is False)
+
+    max_workers = Maximum number of variables changed at the same time (default is 8)
+    """
+    api_url_base = set_bas_url(url)
+    access_key = get_token(url,username, password)
+    headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
+    api_url = '{0}codestream/api/variables'.format(api_url_base)
+    existing = dict(((x.get('project'), x['name']), x) for x in _cs_get_all(api_url, headers))
+    jobs = []
+    wanted = set()
+    unchanged = []
+    invalid = []
+    for name, spec in sorted(variables.items()):
+        if isinstance(spec, dict) and all(x in spec for x in ("project", "type", "value")):
+            data = _cs_variable_data(name,spec['project'],spec['type'],spec['value'],spec.get('description'))
+        elif isinstance(spec, (list, tuple)) and len(spec) in (3, 4):
+            data = _cs_variable_data(name,*spec)
+        else:
+            invalid.append({"name": name, "status": "failed", "error": "Variable must be [project, type, value, description] or a dict with project, type and value"})
+            continue
+        wanted.add((data['project'], name))
+        current = existing.get((data['project'], name))
+        if current == None:
+            jobs.append(("created", data, None))
+            continue
+        compare = dict(data)
+        if data['type'] != "REGULAR" and not update_secrets:
+            compare.pop('value')
+        if _diff_fields(compare, dict(current, description=current.get('description') or "")) or (data['type'] != "REGULAR" and update_secrets):
+            jobs.append(("updated", data, current))
+        else:
+            unchanged.append({"name": name, "project": data['project'], "status": "unchanged"})
+    if prune:
+        projects = set(x[0] for x in wanted)
+        for key, current in sorted(existing.items(), key=lambda x: (str(x[0][0]), x[0][1])):
+            if key[0] in projects and key not in wanted:
+                jobs.append(("deleted", {"name": current['name'], "project": current.get('project')}, current))
+    results = invalid + unchanged + _run_concurrently(lambda x: _sync_cs_variable(api_url,headers,x[0],x[1],x[2]), jobs, max_workers)
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    print('Code Stream variables: ' + ", ".join(k + ' ' + str(v) for k, v in sorted(counts.items())))
+    return results
 
 def delete_variable(url,username,password,variable_name):
     """
@@ -3359,6 +5682,8 @@ def delete_variable(url,username,password,variable_name):
     api_url_base = set_bas_url(url)
     access_key = get_token(url,username, password)
     var_id = get_variable_by_name(url,username,password,variable_name)
+    if var_id == "Variable " + variable_name + " not found!":
+        return var_id
     headers = {'Content-Type': 'application/json','Authorization': 'Bearer {0}'.format(access_key)}
     api_url = '{0}codestream/api/variables/{1}'.format(api_url_base,var_id)
     response = requests.delete(api_url, headers=headers, verify=False)